@@ -1,4 +1,5 @@
 import os
+import tempfile
 from distutils.util import strtobool
 
 from dotenv import load_dotenv
@@ -38,6 +39,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipe_features.metrics.MetricsMiddleware',
+    'recipe_features.profiling.ProfilingMiddleware',
+    'recipe_features.query_log.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +73,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'recipe_backend.wsgi.application'
 
+TEST_RUNNER = 'recipe_backend.test_runner.TestRunner'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -80,6 +86,23 @@ DATABASES = {
     }
 }
 
+# Catalog versions and change stamps live in the default cache and must
+# be seen by every gunicorn worker and management command, so it defaults
+# to files shared on the host. With a per-process cache (locmem, dummy)
+# the tag cache, the ingredient index and 304 answers are switched off.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'recipe-backend-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -148,6 +171,73 @@ DJOSER = {
 }
 
 
+TAG_CACHE_TIMEOUT = int(os.getenv('TAG_CACHE_TIMEOUT', 60 * 60 * 24))
+
+INGREDIENT_INDEX_ENABLED = bool(
+    strtobool(os.getenv('INGREDIENT_INDEX_ENABLED', 'True')))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+SHOPPING_LIST_EXPORTERS = [
+    'recipe_features.download_feature.pdf_downloader.PDFDownload',
+    'recipe_features.download_feature.txt_downloader.TXTDownload',
+    'recipe_features.download_feature.csv_downloader.CSVDownload',
+    'recipe_features.download_feature.json_downloader.JSONDownload',
+]
+
+# Size of the in-process pool running background jobs; 0 runs them inline.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# Export job records live in the default cache, so with several server
+# processes CACHE_BACKEND has to point at a shared cache.
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 60 * 60))
+# Rendered exports are private files, outside MEDIA_ROOT: nothing serves
+# them but the download views. `clean-exports` deletes the ones older
+# than EXPORT_RESULTS_TTL, which is kept above EXPORT_JOB_TIMEOUT.
+EXPORT_RESULTS_ROOT = os.getenv(
+    'EXPORT_RESULTS_ROOT', os.path.join(BASE_DIR, 'exports'))
+EXPORT_RESULTS_TTL = max(
+    int(os.getenv('EXPORT_RESULTS_TTL', 24 * 60 * 60)), EXPORT_JOB_TIMEOUT)
+
+# Recipe image uploads (base64 or multipart) are refused above these.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 8000))
+
+# Resized copies of recipe images, rendered on the background workers.
+# `crop` cuts the image to the exact size, otherwise it is fitted inside.
+RECIPE_IMAGE_VARIANTS = {
+    'thumb': {'size': (160, 160), 'crop': True},
+    'card': {'size': (600, 400), 'crop': True},
+    'full': {'size': (1600, 1600)},
+}
+
+# Text search configuration of the recipe search vector (Postgres).
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+# Per-request profiling (Server-Timing header, slow request buffer).
+PROFILING_ENABLED = bool(strtobool(os.getenv('PROFILING_ENABLED', 'False')))
+# Requests at least this slow are kept, the last PROFILING_BUFFER_SIZE
+# of them per process.
+PROFILING_SLOW_REQUEST_MS = float(os.getenv('PROFILING_SLOW_REQUEST_MS', 200))
+PROFILING_BUFFER_SIZE = int(os.getenv('PROFILING_BUFFER_SIZE', 100))
+# A query fingerprint run this many times in one request is an N+1.
+PROFILING_SIMILAR_QUERIES = int(os.getenv('PROFILING_SIMILAR_QUERIES', 3))
+
+# Prometheus metrics on /metrics. Several server processes (gunicorn
+# workers) add up their values through files in METRICS_DIR; without it
+# each process reports only its own.
+METRICS_ENABLED = bool(strtobool(os.getenv('METRICS_ENABLED', 'True')))
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 2))
+
+# Sampled SQL log, see recipe_features.query_log and analyze-query-log.
+QUERY_LOG_ENABLED = bool(strtobool(os.getenv('QUERY_LOG_ENABLED', 'False')))
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', 0.01))
+QUERY_LOG_MIN_MS = float(os.getenv('QUERY_LOG_MIN_MS', 0))
+QUERY_LOG_DIR = os.getenv('QUERY_LOG_DIR', os.path.join(BASE_DIR, 'query-log'))
+QUERY_LOG_MAX_BYTES = int(os.getenv('QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+QUERY_LOG_BACKUPS = int(os.getenv('QUERY_LOG_BACKUPS', 5))
+
 REST_USE_JWT = True
 JWT_AUTH_COOKIE = "my-app-auth"
 PASSWORD_RESET_TIMEOUT_DAYS = 1 / 24
@@ -0,0 +1,35 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+class TestRunner(DiscoverRunner):
+    '''Run the tests with the file cache in a directory of their own.
+
+    The default cache is shared on disk, so without this a test run would
+    read the catalog versions and stamps of the server or of an earlier
+    run, which point at rows of another database.
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = None
+        default = settings.CACHES['default']
+        if default['BACKEND'] != FILE_CACHE:
+            return
+        self.cache_dir = tempfile.mkdtemp(prefix='recipe-test-cache-')
+        self.cache_settings = override_settings(CACHES={
+            **settings.CACHES,
+            'default': {**default, 'LOCATION': self.cache_dir}})
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        if self.cache_settings is not None:
+            self.cache_settings.disable()
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
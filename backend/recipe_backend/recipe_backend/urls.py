@@ -4,8 +4,11 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from recipe_features.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/', include('recipe_features.urls')),
     path('api/', include('users.urls')),
     path('redoc/', TemplateView.as_view(
@@ -5,7 +5,7 @@ from django.utils.safestring import mark_safe
 
 from recipe_backend.settings import BASE_DIR
 from .models import (Cart, Favorite, Follow, Ingredient, Recipe,
-                     RecipeIngredient, Tag)
+                     RecipeIngredient, ShoppingListItem, Tag)
 
 
 @admin.register(Tag)
@@ -73,6 +73,14 @@ class CartAdmin(admin.ModelAdmin):
     ordering = ('user',)
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    ordering = ('user',)
+    readonly_fields = ('user', 'ingredient', 'total_amount')
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecipeFeaturesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe_features'
+
+    def ready(self):
+        from recipe_features import checks, signals  # noqa: F401
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+
+VERSION_KEY = 'catalog-version:{name}'
+# Backends whose values only the process that wrote them can read.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    '''Whether every process reads what the others write to the cache.
+
+    Versions and change stamps bumped by another gunicorn worker or by a
+    management command are invisible in a per-process cache, so nothing
+    may be served from them then.
+    '''
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def get_version(name):
+    '''Return the current version of a catalog (tags, ingredients, ...).
+
+    Versions live in the default cache, so with a shared backend every
+    worker sees a bump at once. A missing key is seeded with the current
+    time in milliseconds, so an evicted counter never goes back to a
+    value that older cache entries were stored under.
+    '''
+    key = VERSION_KEY.format(name=name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.get(key)
+    return version
+
+
+def bump_version(name):
+    '''Invalidate everything cached for a catalog.'''
+    key = VERSION_KEY.format(name=name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(name)
+        return cache.incr(key)
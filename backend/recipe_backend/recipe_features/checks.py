@@ -0,0 +1,20 @@
+from django.core.checks import Warning, register
+
+from recipe_features.catalog_version import shared_cache
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    '''Warn when the default cache is private to each process.'''
+    if shared_cache():
+        return []
+    return [Warning(
+        'The default cache is private to each process.',
+        hint=(
+            'Catalog versions and change stamps bumped by other workers '
+            'or by load-csv are not seen, so the ingredient index, the '
+            'tag cache and 304 answers are switched off. Set '
+            'CACHE_BACKEND to a shared backend (the file cache by '
+            'default, memcached, redis, ...).'),
+        id='recipe_features.W001',
+    )]
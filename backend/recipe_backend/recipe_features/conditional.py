@@ -0,0 +1,100 @@
+from calendar import timegm
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from recipe_features.catalog_version import shared_cache
+from recipe_features.metrics import cache_lookup
+
+CHANGED_AT_KEY = 'changed-at:{name}'
+# Stamped by the signals whenever any listed recipe or author changes.
+RECIPES = 'recipes'
+USERS = 'users'
+
+
+def get_changed_at(name):
+    '''Return when `name` last changed, as stamped in the default cache.
+
+    A missing stamp (never set, evicted or another cache) is seeded with
+    the current time: it can only make a validator newer, so clients
+    re-download once instead of getting a stale 304.
+    '''
+    key = CHANGED_AT_KEY.format(name=name)
+    changed_at = cache_lookup('changed-at', cache.get(key))
+    if changed_at is None:
+        cache.add(key, timezone.now(), timeout=None)
+        return cache.get(key)
+    return changed_at
+
+
+def mark_changed(name):
+    cache.set(CHANGED_AT_KEY.format(name=name), timezone.now(), timeout=None)
+
+
+def mark_changed_on_commit(name):
+    '''Stamp `name` now and again once the transaction commits.
+
+    A response built from the data before the commit could otherwise
+    carry the new stamp and be revalidated with 304 afterwards.
+    '''
+    mark_changed(name)
+    transaction.on_commit(partial(mark_changed, name))
+
+
+def user_state(user_id):
+    '''Name of the stamp for a user's favorites, cart and subscriptions.'''
+    return f'user-state:{user_id}'
+
+
+class Validators:
+    '''ETag and Last-Modified built from change timestamps.
+
+    For authenticated users the stamp of their favorites/cart/follows is
+    mixed in, since `is_favorited`, `is_in_shopping_cart` and
+    `is_subscribed` are part of the payload.
+    '''
+
+    def __init__(self, request, *stamps, extra=()):
+        user = request.user
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        if user.is_authenticated:
+            stamps.append(get_changed_at(user_state(user.pk)))
+        self.private = user.is_authenticated
+        self.last_modified = max(stamps) if stamps else None
+        parts = [request.get_full_path(), user.pk]
+        parts.extend(stamp.isoformat() for stamp in stamps)
+        parts.extend(extra)
+        self.etag = quote_etag(md5(
+            '|'.join(str(part) for part in parts).encode()).hexdigest())
+
+    def respond(self, request, view, *args, **kwargs):
+        '''Answer with 304 if the client is up to date, else call `view`.
+
+        Without a shared cache the stamps are this process' own, blind to
+        writes made elsewhere: the response then carries no validators.
+        '''
+        if not shared_cache():
+            return view(request, *args, **kwargs)
+        last_modified = None
+        if self.last_modified is not None:
+            last_modified = timegm(self.last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            if self.private:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+        return response
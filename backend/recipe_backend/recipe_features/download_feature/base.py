@@ -0,0 +1,51 @@
+from django.http import StreamingHttpResponse
+
+from recipe_features.download_feature.utils import format_ingredient
+from recipe_features.metrics import timed_chunks
+
+
+def chunked(strings, size=64 * 1024):
+    '''Join small strings into utf-8 blocks of about `size` bytes.'''
+    buffer, length = [], 0
+    for string in strings:
+        data = string.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class BaseDownload:
+    '''Shopping list exporter.
+
+    `ingredients` are rows with `ingredient__name`,
+    `ingredient__measurement_unit` and `amount`; they are consumed lazily
+    so a queryset iterator is never loaded into memory at once.
+    '''
+    format = None
+    media_type = None
+    filename = 'dowload'
+    # Keep rendered files in the export result cache on plain downloads
+    # too; worth it only for formats that are slow to render.
+    cache_results = False
+
+    def lines(self, ingredients):
+        return (format_ingredient(ingredient) for ingredient in ingredients)
+
+    def iter_chunks(self, ingredients, header):
+        raise NotImplementedError
+
+    def write(self, ingredients, header, output):
+        for chunk in self.iter_chunks(ingredients, header):
+            output.write(chunk)
+
+    def download(self, ingredients, header):
+        result = StreamingHttpResponse(
+            timed_chunks(self.format, self.iter_chunks(ingredients, header)),
+            content_type=self.media_type)
+        result.headers['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}.{self.format}"')
+        return result
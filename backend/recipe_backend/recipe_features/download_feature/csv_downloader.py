@@ -0,0 +1,28 @@
+import csv
+
+from recipe_features.download_feature.base import BaseDownload, chunked
+
+
+class Echo:
+    '''File-like object whose write() hands the row back to the caller.'''
+
+    def write(self, value):
+        return value
+
+
+class CSVDownload(BaseDownload):
+    format = 'csv'
+    media_type = 'text/csv; charset=utf-8'
+    columns = ('name', 'measurement_unit', 'amount')
+
+    def iter_chunks(self, ingredients, header):
+        yield from chunked(self.rows(ingredients))
+
+    def rows(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount']))
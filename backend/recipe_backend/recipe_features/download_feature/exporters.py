@@ -0,0 +1,39 @@
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    '''Lets DRF content negotiation (`?format=`, `Accept`) pick an exporter.
+
+    Exporters build their own responses, the view renders anything else
+    with JSONRenderer, so this is only a fallback.
+    '''
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+
+def load_exporters():
+    '''Exporters from `SHOPPING_LIST_EXPORTERS`; the first is the default.'''
+    return OrderedDict(
+        (exporter.format, exporter)
+        for exporter in map(import_string, settings.SHOPPING_LIST_EXPORTERS))
+
+
+EXPORTERS = load_exporters()
+
+EXPORT_RENDERERS = [
+    type(f'{exporter.__name__}Renderer', (ExportRenderer,), {
+        'format': exporter.format,
+        'media_type': exporter.media_type.split(';')[0],
+    })
+    for exporter in EXPORTERS.values()]
+
+
+def get_exporter(export_format):
+    return EXPORTERS[export_format]()
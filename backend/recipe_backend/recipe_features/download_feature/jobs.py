@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse
+from django.utils import timezone
+
+from recipe_features.metrics import cache_hit, observe_export
+from recipe_features.workers import submit
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'export-job:{id}'
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def content_digest(exporter, ingredients, header):
+    '''sha256 of everything that ends up in an export.
+
+    Two carts with the same aggregated contents share a digest, so the
+    file rendered for one is served to the other.
+    '''
+    digest = hashlib.sha256()
+    exporter_class = type(exporter)
+    for part in (exporter_class.__module__, exporter_class.__qualname__,
+                 exporter.format, header):
+        digest.update(f'{part}\n'.encode('utf-8'))
+    for ingredient in ingredients:
+        digest.update('\x1f'.join((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            str(ingredient['amount']),
+        )).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+def result_storage():
+    '''Private storage of rendered exports, it has no public URL.'''
+    return FileSystemStorage(
+        location=settings.EXPORT_RESULTS_ROOT, base_url=None)
+
+
+def result_name(exporter, digest):
+    return f'{digest}.{exporter.format}'
+
+
+def is_fresh(storage, name):
+    '''Whether `name` is stored and younger than EXPORT_RESULTS_TTL.'''
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    age = (timezone.now() - modified).total_seconds()
+    return age < settings.EXPORT_RESULTS_TTL
+
+
+def expired_results(storage=None):
+    '''Names of the stored exports older than EXPORT_RESULTS_TTL.'''
+    storage = storage or result_storage()
+    if not os.path.isdir(storage.location):
+        return []
+    _, names = storage.listdir('')
+    return [name for name in names if not is_fresh(storage, name)]
+
+
+def store_result(exporter, ingredients, header, name):
+    '''Render into the storage under `name` unless a fresh copy is there.'''
+    storage = result_storage()
+    if cache_hit('export-results', is_fresh(storage, name)):
+        return
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as output:
+        started = time.perf_counter()
+        exporter.write(ingredients, header, output)
+        observe_export(exporter.format, started)
+        output.seek(0)
+        if storage.exists(name):
+            # Expired, replaced by the new rendering.
+            storage.delete(name)
+        saved = storage.save(name, File(output))
+    if saved != name:
+        # A concurrent job stored the same content first.
+        storage.delete(saved)
+
+
+def serve_result(exporter, name):
+    result = FileResponse(
+        result_storage().open(name, 'rb'), as_attachment=True,
+        filename=f'{exporter.filename}.{exporter.format}')
+    result.headers['Content-Type'] = exporter.media_type
+    return result
+
+
+def cached_download(exporter, ingredients, header):
+    '''Serve the cached file for these contents, rendering it if needed.'''
+    ingredients = list(ingredients)
+    name = result_name(
+        exporter, content_digest(exporter, ingredients, header))
+    store_result(exporter, ingredients, header, name)
+    return serve_result(exporter, name)
+
+
+def save_job(job):
+    cache.set(JOB_KEY.format(id=job['id']), job,
+              timeout=settings.EXPORT_JOB_TIMEOUT)
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(id=job_id))
+
+
+def run_job(job, exporter, ingredients, header):
+    try:
+        store_result(exporter, ingredients, header, job['result'])
+    except Exception:
+        logger.exception('Export job %s failed', job['id'])
+        job['status'] = FAILED
+    else:
+        job['status'] = DONE
+    save_job(job)
+
+
+def start_job(user, exporter, ingredients, header):
+    '''Queue an export of `ingredients` and return the job record.
+
+    The rows are read here, in the request, and only rendering happens
+    on the worker pool. When a file with the same content digest is
+    already stored the job is done right away.
+    '''
+    ingredients = list(ingredients)
+    name = result_name(
+        exporter, content_digest(exporter, ingredients, header))
+    job = {
+        'id': uuid.uuid4().hex,
+        'user': user.pk,
+        'format': exporter.format,
+        'result': name,
+        'status': PENDING,
+    }
+    if is_fresh(result_storage(), name):
+        job['status'] = DONE
+        save_job(job)
+        return job
+    save_job(job)
+    submit(run_job, dict(job), exporter, ingredients, header)
+    return get_job(job['id']) or job
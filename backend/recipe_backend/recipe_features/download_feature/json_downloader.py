@@ -0,0 +1,24 @@
+import json
+
+from recipe_features.download_feature.base import BaseDownload, chunked
+
+
+class JSONDownload(BaseDownload):
+    format = 'json'
+    media_type = 'application/json'
+
+    def iter_chunks(self, ingredients, header):
+        yield from chunked(self.parts(ingredients, header))
+
+    def parts(self, ingredients, header):
+        yield '{"title": %s, "ingredients": [' % json.dumps(
+            header, ensure_ascii=False)
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ', '
+        yield ']}'
@@ -1,36 +1,106 @@
-import io
 import os
+import tempfile
+import threading
+import time
 
 from django.http import FileResponse
 from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from recipe_features.download_feature.base import BaseDownload
+from recipe_features.metrics import observe_export
 
-class PDFDownload:
-    def download(self, downloadlist, header):
-        font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                                 'fonts', 'OpenSans-Regular.ttf')
-        pdfmetrics.registerFont(TTFont('sans', font_path))
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        h = p.beginText(100, 750)
-        h.setFont('sans', 20)
+FONT_NAME = 'sans'
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'fonts', 'OpenSans-Regular.ttf')
+
+_font_lock = threading.Lock()
+
+
+def register_font():
+    '''Parse the TTF file and register it once per process.'''
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    with _font_lock:
+        if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class PDFDownload(BaseDownload):
+    '''Shopping list as a PDF that runs over as many A4 pages as needed.
+
+    The document is written to a spooled temporary file (memory for small
+    lists, disk for large ones) and streamed from it in `chunk_size`
+    blocks.
+    '''
+    format = 'pdf'
+    media_type = 'application/pdf'
+    page_size = A4
+    left = 100
+    top = 750
+    bottom = 50
+    header_font_size = 20
+    font_size = 15
+    leading = 18
+    chunk_size = 64 * 1024
+    spool_size = 1024 * 1024
+    cache_results = True
+
+    def begin_text(self, p, y):
+        t = p.beginText(self.left, y)
+        t.setFillColorRGB(0, 0, 0)
+        t.setFont(FONT_NAME, self.font_size, self.leading)
+        return t
+
+    def render(self, ingredients, header, output):
+        register_font()
+        p = canvas.Canvas(output, pagesize=self.page_size)
+        h = p.beginText(self.left, self.top)
+        h.setFont(FONT_NAME, self.header_font_size)
         h.setFillColorRGB(0, 0, 1)
         h.textLine(header)
         p.drawText(h)
 
-        t = p.beginText(100, 700)
-        t.setFillColorRGB(0, 0, 0)
-        t.setFont('sans', 15)
-        for s in downloadlist:
-            t.textLine(f'* {s}')
+        width = self.page_size[0] - 2 * self.left
+        t = self.begin_text(p, self.top - 50)
+        for s in self.lines(ingredients):
+            for line in simpleSplit(
+                    f'* {s}', FONT_NAME, self.font_size, width):
+                if t.getY() < self.bottom:
+                    p.drawText(t)
+                    p.showPage()
+                    t = self.begin_text(p, self.top)
+                t.textLine(line)
         p.drawText(t)
         p.showPage()
         p.save()
-        buffer.seek(0)
+
+    def write(self, ingredients, header, output):
+        self.render(ingredients, header, output)
+
+    def spool(self, ingredients, header):
+        output = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        self.render(ingredients, header, output)
+        size = output.tell()
+        output.seek(0)
+        return output, size
+
+    def iter_chunks(self, ingredients, header):
+        output, _ = self.spool(ingredients, header)
+        with output:
+            yield from iter(lambda: output.read(self.chunk_size), b'')
+
+    def download(self, ingredients, header):
+        started = time.perf_counter()
+        output, size = self.spool(ingredients, header)
+        observe_export(self.format, started)
         result = FileResponse(
-            buffer, as_attachment=True, filename='dowload.pdf')
-        result.headers['Content-Type'] = 'application/pdf'
+            output, as_attachment=True,
+            filename=f'{self.filename}.{self.format}')
+        result.block_size = self.chunk_size
+        result.headers['Content-Type'] = self.media_type
+        result.headers['Content-Length'] = size
         return result
@@ -1,12 +1,14 @@
-from functools import reduce
+from recipe_features.download_feature.base import BaseDownload, chunked
 
-from django.http import FileResponse
 
+class TXTDownload(BaseDownload):
+    format = 'txt'
+    media_type = 'text/plain; charset=utf-8'
 
-class TXTDownload:
-    def download(self, downloadlist, header):
-        title = header + '\n\n'
-        plot = reduce(lambda akk, s: akk + f'* {s}\n', downloadlist, title)
-        result = FileResponse(plot, as_attachment=True, filename='dowload.txt')
-        result.headers['Content-Type'] = 'plain/text'
-        return result
+    def iter_chunks(self, ingredients, header):
+        yield from chunked(self.text(ingredients, header))
+
+    def text(self, ingredients, header):
+        yield header + '\n\n'
+        for s in self.lines(ingredients):
+            yield f'* {s}\n'
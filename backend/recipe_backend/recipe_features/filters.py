@@ -1,34 +1,132 @@
-from django.db.models import Q
-from django_filters import AllValuesMultipleFilter, BooleanFilter
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+from django_filters import MultipleChoiceFilter
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend, SearchFilter
 
-from recipe_features.models import Recipe
+from recipe_features import search
+from recipe_features.catalog_version import TAGS, get_version, shared_cache
+from recipe_features.ingredient_index import MIN_CONTAINS_LENGTH
+from recipe_features.metrics import cache_lookup
+from recipe_features.models import (Cart, Favorite, Recipe, Tag, favorited_by,
+                                    in_cart_of)
+
+TAG_IDS_CACHE_KEY = 'tag-ids:{version}'
 
 
 class IngredientSearchFilter(SearchFilter):
+    '''
+    Search by name: the exact match, then names starting with the term,
+    then names containing it.
+
+    Lookups go through `lower(name)`, so on Postgres the prefix part uses
+    the text_pattern_ops index and the contains part the trigram index.
+    Terms shorter than MIN_CONTAINS_LENGTH are matched by prefix only,
+    trigrams cannot narrow them down.
+    '''
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        term = term.strip().lower()
+        if not term:
+            return queryset
+        queryset = queryset.annotate(lower_name=Lower('name'))
+        if len(term) < MIN_CONTAINS_LENGTH:
+            queryset = queryset.filter(lower_name__startswith=term)
+        else:
+            queryset = queryset.filter(lower_name__contains=term)
+        return queryset.annotate(match_rank=Case(
+            When(lower_name=term, then=Value(0)),
+            When(lower_name__startswith=term, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )).order_by('match_rank', 'lower_name')
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    '''
+    Full-text search over the recipe name, ingredient names and text,
+    best matches first.
+
+    Postgres matches the stored `search_vector` through its GIN index,
+    SQLite the FTS5 table (see recipe_features.search). Applied after
+    RecipeFilter, so it narrows the tag/author/favorite results.
+    '''
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        return search.search(queryset, term).order_by(
+            '-search_rank', *Recipe._meta.ordering)
+
+
+def tag_ids():
+    '''`{slug: id}` of all tags, cached under the tags catalog version.
+
+    Read from the database each time with a per-process cache, where
+    tags loaded by load-csv would stay unknown until the entry expires.
+    '''
+    if not shared_cache():
+        return dict(Tag.objects.values_list('slug', 'id'))
+    key = TAG_IDS_CACHE_KEY.format(version=get_version(TAGS))
+    ids = cache_lookup('tag-ids', cache.get(key))
+    if ids is None:
+        ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, ids, settings.TAG_CACHE_TIMEOUT)
+    return ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids()]
+
 
 class RecipeFilter(filters.FilterSet):
     '''
     Filter for filtring by is_favorited, author, tags and is_in_shopping_cart
+
+    Recipes having any of the `tags` are matched with one IN subquery on
+    the recipe-tag table (a semi-join), so a recipe is listed once
+    however many of the tags it has. Slugs are validated and resolved
+    from the cached tag_ids() map instead of a DISTINCT over the recipe
+    tags.
     '''
 
-    is_in_shopping_cart = BooleanFilter(method='get_in_cart')
-    is_favorited = BooleanFilter(method='get_is_favourite')
-    tags = AllValuesMultipleFilter(
-        field_name='tags__slug')
+    is_in_shopping_cart = filters.BooleanFilter(method='get_in_cart')
+    is_favorited = filters.BooleanFilter(method='get_is_favourite')
+    tags = MultipleChoiceFilter(choices=tag_choices, method='get_tags')
+
+    def get_tags(self, queryset, field_name, value):
+        ids = tag_ids()
+        return queryset.filter(pk__in=Recipe.tags.through.objects.filter(
+            tag__in=[ids[slug] for slug in value]).values('recipe'))
 
     def get_in_cart(self, queryset, field_name, value):
-        if value:
-            return queryset.filter(purchases__user=self.request.user)
-        return queryset.filter(~Q(purchases__user=self.request.user))
+        return self.filter_user_flag(
+            queryset, value, in_cart_of, Cart.objects.values('purchase'))
 
     def get_is_favourite(self, queryset, field_name, value):
+        return self.filter_user_flag(
+            queryset, value, favorited_by, Favorite.objects.values('recipe'))
+
+    def filter_user_flag(self, queryset, value, flag, recipe_ids):
+        '''
+        IN (the user's favorites or cart) / NOT EXISTS; both forms read
+        the (user, recipe) unique index and never join the recipe rows.
+        The positive form is a semi-join starting from the user's few
+        rows, SQLite would run EXISTS once per recipe. Anonymous users
+        have neither, so no subquery is needed.
+        '''
+        user = getattr(self.request, 'user', None)
+        if user is None or user.is_anonymous:
+            return queryset.none() if value else queryset
         if value:
-            return queryset.filter(favorite_rec__user=self.request.user)
-        return queryset.filter(~Q(favorite_rec__user=self.request.user))
+            return queryset.filter(pk__in=recipe_ids.filter(user=user))
+        return queryset.filter(~flag(user))
 
     class Meta:
         model = Recipe
@@ -0,0 +1,140 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+from recipe_features.conditional import RECIPES, mark_changed_on_commit
+from recipe_features.models import Recipe
+from recipe_features.workers import submit
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def variant_name(original, variant, image_format):
+    '''`recipes/pie.png` -> `recipes/variants/pie/card.webp`.'''
+    folder, filename = os.path.split(original)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        folder, 'variants', stem, f'{variant}.{EXTENSIONS[image_format]}')
+
+
+def resize(image, size, crop):
+    '''Cover-crop to `size`, or fit inside it, never upscaling.'''
+    if crop:
+        width, height = size
+        # A small source keeps the aspect ratio of the variant.
+        scale = min(1, image.width / width, image.height / height)
+        return ImageOps.fit(image, (
+            max(1, round(width * scale)), max(1, round(height * scale))),
+            method=Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def encode(image, image_format):
+    '''Encode without EXIF/ICC/XMP metadata; JPEG gets a white background.'''
+    pil_format, options = FORMATS[image_format]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    output = BytesIO()
+    image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+def render_variants(original):
+    '''Write all variants of the stored image `original`.
+
+    Returns `{variant: {format: storage name}}`.
+    '''
+    with default_storage.open(original, 'rb') as f:
+        source = Image.open(f)
+        source.load()
+    # Apply the EXIF rotation before the metadata is dropped.
+    source = ImageOps.exif_transpose(source)
+    variants = {}
+    for variant, spec in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = resize(source, spec['size'], spec.get('crop', False))
+        variants[variant] = {}
+        for image_format in spec.get('formats', FORMATS):
+            name = variant_name(original, variant, image_format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[variant][image_format] = default_storage.save(
+                name, ContentFile(encode(image, image_format)))
+    return variants
+
+
+def generate_variants(recipe_id):
+    '''Render the variants of a recipe image and record them.
+
+    Runs on the worker pool; when the image was replaced meanwhile the
+    result is dropped, the newer upload has its own job queued.
+    '''
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe['image']:
+        return None
+    variants = render_variants(recipe['image'])
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe['image']).update(
+            image_variants=variants, updated_at=timezone.now())
+    if updated:
+        # update() sends no signal: the list validators must change too.
+        mark_changed_on_commit(RECIPES)
+        stale = variant_names(recipe['image_variants']) - variant_names(
+            variants)
+    else:
+        stale = variant_names(variants)
+    for name in stale:
+        default_storage.delete(name)
+    return variants
+
+
+def variant_names(variants):
+    return {
+        name for formats in (variants or {}).values()
+        for name in formats.values()}
+
+
+def delete_variants(variants):
+    '''Delete the files of `{variant: {format: storage name}}`.'''
+    for name in variant_names(variants):
+        default_storage.delete(name)
+
+
+def queue_variants(recipe_ids):
+    for recipe_id in recipe_ids:
+        submit(generate_variants, recipe_id)
+
+
+def variant_url(recipe, variant, image_format='jpeg'):
+    '''URL of a variant, or of the original while it is being rendered.'''
+    name = (recipe.image_variants or {}).get(variant, {}).get(image_format)
+    if name:
+        return default_storage.url(name)
+    if recipe.image:
+        return recipe.image.url
+    return None
+
+
+def variant_urls(recipe):
+    '''`{variant: {format: url}}` of the rendered variants.'''
+    return {
+        variant: {
+            image_format: default_storage.url(name)
+            for image_format, name in formats.items()}
+        for variant, formats in (recipe.image_variants or {}).items()}
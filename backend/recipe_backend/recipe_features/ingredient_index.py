@@ -0,0 +1,77 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipe_features.catalog_version import INGREDIENTS, get_version
+from recipe_features.models import Ingredient
+
+MIN_CONTAINS_LENGTH = 3
+# Version of an index never built: get_version() can return None (with
+# the dummy cache), which must still trigger the first build.
+NOT_BUILT = object()
+
+
+class IngredientPrefixIndex:
+    '''Per-process sorted index over ingredient names for autocomplete.
+
+    Lookups bisect into the lower-cased, sorted names, so they never hit
+    the database. Results are ranked: the exact match, then the other
+    names starting with the term (alphabetically, like
+    `Ingredient.Meta.ordering`), then names containing it (for terms of
+    at least MIN_CONTAINS_LENGTH characters). The index is
+    rebuilt on the next lookup after the ingredient catalog version is
+    bumped, which other processes only see through a shared cache: the
+    view does not use the index with a per-process one.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = NOT_BUILT
+        # (keys, ingredients) replaced as one tuple, so a reader never
+        # pairs the keys of one build with the ingredients of another.
+        self._data = ([], [])
+
+    def rebuild(self, version=None):
+        rows = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.order_by(
+            ).values_list('id', 'name', 'measurement_unit'))
+        keys = [row[0] for row in rows]
+        ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in rows]
+        self._data = (keys, ingredients)
+        self._version = version
+
+    def _snapshot(self):
+        version = get_version(INGREDIENTS)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self.rebuild(version)
+        return self._data
+
+    def search(self, term, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        term = term.strip().lower()
+        keys, ingredients = self._snapshot()
+        if not term:
+            return ingredients[:limit]
+        result = []
+        position = bisect_left(keys, term)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(term)):
+            result.append(ingredients[position])
+            position += 1
+        if len(term) < MIN_CONTAINS_LENGTH:
+            return result
+        for index, key in enumerate(keys):
+            if len(result) >= limit:
+                break
+            if term in key and not key.startswith(term):
+                result.append(ingredients[index])
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_features import query_log
+
+ORDERS = {'total': 'total_ms', 'calls': 'calls', 'p95': 'p95_ms'}
+
+
+class Command(BaseCommand):
+    """Rank the query fingerprints of the sampled query log
+
+    example: `python manage.py analyze-query-log --view RecipeViesSet.list`
+    """
+
+    help = (
+        "Aggregate the logs written with QUERY_LOG_ENABLED into total"
+        " time, call count and p95 per SQL fingerprint, with the views,"
+        " serializer methods and lines running them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir", default=settings.QUERY_LOG_DIR,
+            help="log directory, QUERY_LOG_DIR by default")
+        parser.add_argument(
+            "--limit", type=int, default=20,
+            help="number of fingerprints to show")
+        parser.add_argument(
+            "--order", choices=ORDERS, default="total",
+            help="rank by total time, call count or p95")
+        parser.add_argument(
+            "--view", help="only queries of this view, e.g. "
+            "RecipeViesSet.list")
+
+    def handle(self, *args, **options):
+        paths = query_log.log_files(options["dir"])
+        if not paths:
+            raise CommandError(f"No query logs in {options['dir']}.")
+        entries = query_log.read_entries(paths)
+        if options["view"]:
+            entries = (
+                entry for entry in entries
+                if entry["view"] == options["view"])
+        report = query_log.aggregate(entries)
+        report.sort(key=lambda row: row[ORDERS[options["order"]]],
+                    reverse=True)
+        calls = sum(row["calls"] for row in report)
+        self.stdout.write(
+            f"{calls} queries, {len(report)} fingerprints"
+            f" in {len(paths)} files")
+        for rank, row in enumerate(report[:options["limit"]], 1):
+            self.stdout.write(
+                f"\n{rank}. total {row['total_ms']:.1f} ms"
+                f"  calls {row['calls']}"
+                f"  p95 {row['p95_ms']:.2f} ms"
+                f"  mean {row['mean_ms']:.2f} ms")
+            self.stdout.write(f"   {row['fingerprint'][:300]}")
+            for (view, serializer, caller), count in row["sites"]:
+                self.stdout.write(
+                    f"   {count}x {view or '-'}"
+                    f" {serializer or '-'} {caller or '-'}")
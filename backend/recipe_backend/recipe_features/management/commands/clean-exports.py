@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipe_features.download_feature import jobs
+
+
+class Command(BaseCommand):
+    """Delete rendered shopping list exports past their lifetime
+
+    example: `python manage.py clean-exports --dry-run`
+    """
+
+    help = (
+        "Delete the exports in EXPORT_RESULTS_ROOT older than"
+        " EXPORT_RESULTS_TTL; run it periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="only list the expired files")
+
+    def handle(self, *args, **options):
+        storage = jobs.result_storage()
+        expired = jobs.expired_results(storage)
+        for name in expired:
+            self.stdout.write(name)
+            if not options["dry_run"]:
+                storage.delete(name)
+        verb = "expired" if options["dry_run"] else "deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(expired)} exports {verb}."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_features.recipe_import import RecipeImporter, open_images
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Import recipes from an NDJSON file
+
+    example: `python manage.py import-recipes recipes.ndjson
+    --images images.zip --author admin`
+    """
+
+    help = (
+        "Import recipes from an NDJSON file, one recipe per line, with"
+        " images taken from a folder or a zip/tar archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ndjson", help="path to the NDJSON file")
+        parser.add_argument(
+            "--images", required=True,
+            help="folder or zip/tar archive with the images")
+        parser.add_argument(
+            "--author",
+            help="username of the author of rows without one")
+        parser.add_argument(
+            "--chunk-size", type=int, default=500,
+            help="recipes written per transaction")
+
+    def handle(self, *args, **options):
+        author = None
+        if options["author"]:
+            author = User.objects.filter(username=options["author"]).first()
+            if author is None:
+                raise CommandError(f"Unknown user {options['author']}")
+        images = open_images(options["images"])
+        try:
+            with open(options["ndjson"], "r", encoding="utf-8") as f:
+                importer = RecipeImporter(
+                    images, default_author=author,
+                    chunk_size=options["chunk_size"]).run(f)
+        finally:
+            images.close()
+        for line, message in importer.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created} recipes,"
+            f" {len(importer.errors)} rows rejected."))
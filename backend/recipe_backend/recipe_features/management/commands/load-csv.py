@@ -1,21 +1,52 @@
 import csv
 import glob
+import io
+import json
 import os
-from collections import OrderedDict
+import time
+from collections import OrderedDict, namedtuple
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, IntegrityError, connection, transaction
 
-from recipe_features.models import Ingredient, Tag
+from recipe_features.catalog_version import INGREDIENTS, TAGS, bump_version
+from recipe_features.models import Ingredient, Recipe, Tag
+from recipe_features.search import schedule_refresh
+from recipe_features.signals import touch_recipes
 
 MODELS_CONTAINER = [
     Ingredient,
     Tag
 ]
+Catalog = namedtuple('Catalog', 'version keys recipe_link')
+CATALOGS = {
+    Ingredient: Catalog(INGREDIENTS, ('name', 'measurement_unit'),
+                        'ingredients'),
+    Tag: Catalog(TAGS, ('slug',), 'tags'),
+}
+CONFLICTS = ('ignore', 'update', 'error')
+# Values per IN lookup when matching a batch against stored rows.
+KEY_CHUNK = 500
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
 
 
 class Command(BaseCommand):
     """Import a csv files into database
 
+    Rows are read lazily and written in batches, each in its own
+    transaction; on Postgres a batch is sent with COPY FROM STDIN. The
+    number of committed rows of every file is kept in a state file, so an
+    interrupted load continues where it stopped with `--resume`.
+
     example: `python manage.py load-csv static/data`
     """
 
@@ -27,6 +58,23 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Loading a particular folder with csv files"""
         parser.add_argument("csv_folder", help="path to csv file", type=str)
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="rows written per transaction")
+        parser.add_argument(
+            "--conflicts", choices=CONFLICTS, default="ignore",
+            help="what to do with rows that already exist: skip them,"
+                 " update them or stop")
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="skip the rows committed by a previous run")
+        parser.add_argument(
+            "--state-file",
+            help="where progress is kept (default: .load-csv-state.json"
+                 " in the csv folder)")
+        parser.add_argument(
+            "--no-copy", action="store_true",
+            help="use INSERT even on Postgres")
 
     def fields_checker(self, fields_name, model_fields):
         """Comparing model database fields with csv file fields"""
@@ -53,30 +101,190 @@ class Command(BaseCommand):
                     model_file_dict[model] = file_name
         return model_file_dict
 
+    def read_state(self):
+        if not os.path.isfile(self.state_file):
+            return {}
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self):
+        if not self.state:
+            if os.path.isfile(self.state_file):
+                os.remove(self.state_file)
+            return
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+
+    def read_rows(self, model, file_name, skip):
+        """Yield the rows of a csv file as dicts, one at a time"""
+        with open(file_name, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter=",", quotechar='"')
+            fields_name = next(reader)
+            model_fields = [field.name for field in model._meta.fields]
+            if not self.fields_checker(fields_name, model_fields):
+                raise CommandError(
+                    f"{file_name}: unknown columns {fields_name}")
+            for raw in islice(reader, skip, None):
+                yield dict(zip(fields_name, raw))
+
+    def existing(self, model, catalog, rows):
+        """Stored objects having the key of one of the rows, by key
+
+        Looked up with chunked IN lists on the first key column, the rest
+        of the key is compared here: an OR branch per row overflows the
+        SQLite expression depth and swamps the Postgres planner.
+        """
+        wanted = {tuple(row[key] for key in catalog.keys) for row in rows}
+        first = catalog.keys[0]
+        found = {}
+        for values in batches(sorted({key[0] for key in wanted}), KEY_CHUNK):
+            for obj in model.objects.filter(**{f"{first}__in": values}):
+                key = tuple(getattr(obj, name) for name in catalog.keys)
+                if key in wanted:
+                    found[key] = obj
+        return found
+
+    def write_orm(self, model, catalog, rows, conflicts):
+        objects = [model(**row) for row in rows]
+        if conflicts == "error":
+            model.objects.bulk_create(objects)
+            return
+        if conflicts == "update":
+            fields = [
+                name for name in rows[0]
+                if name not in catalog.keys and name != "id"]
+            existing = self.existing(model, catalog, rows)
+            to_update = {}
+            for row, obj in zip(rows, objects):
+                current = existing.get(
+                    tuple(row[key] for key in catalog.keys))
+                if current is None:
+                    continue
+                for name in fields:
+                    setattr(current, name, getattr(obj, name))
+                to_update[current.pk] = current
+            if fields:
+                model.objects.bulk_update(to_update.values(), fields)
+            objects = [
+                obj for row, obj in zip(rows, objects)
+                if tuple(row[key] for key in catalog.keys) not in existing]
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def write_copy(self, model, catalog, rows, conflicts):
+        """COPY the batch into a temporary table and insert from there"""
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        names = list(rows[0])
+        columns = ", ".join(
+            quote(model._meta.get_field(name).column) for name in names)
+        data = io.StringIO()
+        csv.writer(data).writerows(
+            [row[name] for name in names] for row in rows)
+        data.seek(0)
+        select = f"SELECT {columns} FROM load_csv"
+        on_conflict = ""
+        if conflicts == "ignore":
+            on_conflict = "ON CONFLICT DO NOTHING"
+        elif conflicts == "update":
+            keys = ", ".join(
+                quote(model._meta.get_field(key).column)
+                for key in catalog.keys)
+            # A batch must not update one row twice.
+            select = f"SELECT DISTINCT ON ({keys}) {columns} FROM load_csv"
+            updates = ", ".join(
+                f"{quote(model._meta.get_field(name).column)} = "
+                f"EXCLUDED.{quote(model._meta.get_field(name).column)}"
+                for name in names
+                if name not in catalog.keys and name != "id")
+            on_conflict = (
+                f"ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+                if updates else "ON CONFLICT DO NOTHING")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE load_csv "
+                f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.cursor.copy_expert(
+                f"COPY load_csv ({columns}) FROM STDIN WITH (FORMAT csv)",
+                data)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) {select} {on_conflict}")
+
+    def reset_sequences(self, model):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [model]):
+                cursor.execute(sql)
+
+    def recipes_changed(self, model, catalog, rows):
+        ids = [obj.pk for obj in self.existing(model, catalog, rows).values()]
+        for chunk in batches(ids, KEY_CHUNK):
+            recipes = Recipe.objects.filter(
+                **{f"{catalog.recipe_link}__in": chunk})
+            touch_recipes(recipes)
+            if model is Ingredient:
+                # Ingredient names are part of the recipe search document.
+                schedule_refresh(recipes.values_list("pk", flat=True))
+
+    def resume_hint(self, done, file_name):
+        return (
+            f"{done} rows of {file_name} are loaded, run again"
+            f" with --resume to continue.")
+
+    def load(self, model, file_name, options):
+        catalog = CATALOGS[model]
+        conflicts = options["conflicts"]
+        write = self.write_orm
+        if connection.vendor == "postgresql" and not options["no_copy"]:
+            write = self.write_copy
+        state_key = os.path.abspath(file_name)
+        done = self.state.get(state_key, 0) if options["resume"] else 0
+        if done:
+            self.stdout.write(f"{model.__name__}: resuming after {done} rows")
+        started, loaded, has_ids = time.monotonic(), 0, False
+        for rows in batches(
+                self.read_rows(model, file_name, done),
+                options["batch_size"]):
+            has_ids = has_ids or "id" in rows[0]
+            try:
+                with transaction.atomic():
+                    write(model, catalog, rows, conflicts)
+                    if conflicts == "update":
+                        self.recipes_changed(model, catalog, rows)
+            except IntegrityError as e:
+                raise CommandError(
+                    f"Кажется, у вас уже есть эти данные! {e}\n"
+                    f"{self.resume_hint(done, file_name)}")
+            except DatabaseError as e:
+                raise CommandError(
+                    f"{e}\n{self.resume_hint(done, file_name)}")
+            done += len(rows)
+            loaded += len(rows)
+            self.state[state_key] = done
+            self.save_state()
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"{model.__name__}: {done} rows,"
+                f" {loaded / elapsed:.0f} rows/sec")
+        if has_ids:
+            self.reset_sequences(model)
+        self.state.pop(state_key, None)
+        self.save_state()
+        bump_version(catalog.version)
+        self.stdout.write(f"finish {model}")
+
     def handle(self, *args, **options):
         """Read csv file and load data into the db"""
 
         csv_folder = options.get("csv_folder", "")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        self.state_file = options["state_file"] or os.path.join(
+            csv_folder, ".load-csv-state.json")
+        self.state = self.read_state()
         all_files = glob.glob(csv_folder + "/*.csv")
         for (key, value) in self.file_to_model(
             all_files,
             MODELS_CONTAINER,
         ).items():
-
-            fields_name = []
-            with open(value, "r", encoding="utf-8") as f:
-                reader = csv.reader(f, delimiter=",", quotechar='"')
-                fields_name = next(reader)
-                entity_list = []
-                for raw in reader:
-                    dict_data = {
-                        fields_name[key]: field for key, field in (
-                            enumerate(raw))}
-                    entity_list.append(key(**dict_data))
-                try:
-                    key.objects.bulk_create(entity_list)
-                    print(f"finish {key}")
-                except Exception as e:
-                    print(f"Кажется, у вас уже есть эти данные! {e}")
-                    continue
+            self.load(key, value, options)
         return "Данные были успешно загружены в базу данных."
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipe_features import search
+
+
+class Command(BaseCommand):
+    """Rebuild the recipe full-text search documents
+
+    example: `python manage.py rebuild-search-index`
+    """
+
+    help = (
+        "Recompute the search document of every recipe, e.g. after"
+        " changing RECIPE_SEARCH_CONFIG or writing recipes with raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipe", action="append", type=int, dest="recipes",
+            help="limit to the given recipe id (repeatable)")
+
+    def handle(self, *args, **options):
+        search.refresh(options["recipes"])
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from recipe_features import shopping_list
+
+
+class Command(BaseCommand):
+    """Check the stored shopping lists against the carts and rebuild them
+
+    example: `python manage.py rebuild-shopping-lists --dry-run`
+    """
+
+    help = (
+        "Compare ShoppingListItem rows with totals computed from the carts"
+        " and rebuild them from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="only report the differences")
+        parser.add_argument(
+            "--user", action="append", type=int, dest="users",
+            help="limit to the given user id (repeatable)")
+
+    def handle(self, *args, **options):
+        user_ids = options["users"]
+        expected = shopping_list.compute_totals(user_ids)
+        stored = shopping_list.stored_totals(user_ids)
+        mismatches = sorted(
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key))
+        for user_id, ingredient_id in mismatches:
+            self.stdout.write(
+                f"user {user_id}, ingredient {ingredient_id}: "
+                f"stored {stored.get((user_id, ingredient_id))}, "
+                f"expected {expected.get((user_id, ingredient_id))}")
+        self.stdout.write(f"{len(mismatches)} mismatched rows")
+        if options["dry_run"]:
+            return
+        shopping_list.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(expected)} shopping list rows."))
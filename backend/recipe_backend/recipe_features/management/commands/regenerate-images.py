@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from recipe_features.images import generate_variants
+from recipe_features.models import Recipe
+from recipe_features.workers import run_in_thread
+
+
+class Command(BaseCommand):
+    """Render the resized variants of recipe images already in the media
+
+    example: `python manage.py regenerate-images --missing --workers 4`
+    """
+
+    help = (
+        "Render the thumb/card/full variants of recipe images, e.g. after"
+        " changing RECIPE_IMAGE_VARIANTS or for media uploaded before the"
+        " image pipeline existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing", action="store_true",
+            help="only recipes that have no variants yet")
+        parser.add_argument(
+            "--recipe", action="append", type=int, dest="recipes",
+            help="limit to the given recipe id (repeatable)")
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="number of images rendered in parallel, 0 renders"
+                 " them one by one in this thread")
+
+    def render(self, recipe_ids, workers):
+        """Yield `(recipe_id, error or None)` as the recipes are done"""
+        if workers < 1:
+            for recipe_id in recipe_ids:
+                try:
+                    generate_variants(recipe_id)
+                except Exception as e:
+                    yield recipe_id, e
+                else:
+                    yield recipe_id, None
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_in_thread, generate_variants, recipe_id):
+                recipe_id for recipe_id in recipe_ids}
+            for future in as_completed(futures):
+                yield futures[future], future.exception()
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('pk')
+        if options["recipes"]:
+            recipes = recipes.filter(pk__in=options["recipes"])
+        if options["missing"]:
+            recipes = recipes.filter(image_variants={})
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        failed = 0
+        for done, (recipe_id, error) in enumerate(
+                self.render(recipe_ids, options["workers"]), start=1):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"recipe {recipe_id}: {error}")
+            if done % 100 == 0:
+                self.stdout.write(f"{done}/{len(recipe_ids)} recipes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered variants of {len(recipe_ids) - failed} recipes,"
+            f" {failed} failed."))
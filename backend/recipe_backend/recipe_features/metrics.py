@@ -0,0 +1,325 @@
+'''Prometheus metrics, summed over all the server processes.
+
+Each process counts in memory. With `METRICS_DIR` set it also writes
+its totals to `METRICS_DIR/<process id>.json`, at most every
+`METRICS_FLUSH_INTERVAL` seconds and on exit, and /metrics adds up the
+files of every process that shares the directory. The process id is
+random, made on first use in each process: a worker started with the
+pid of an exited one gets a file of its own instead of overwriting
+the dead worker's totals. Those files are kept so counters never go
+back, and the directory is only cleared when the server starts, as the
+Docker image does with `rm -rf "$METRICS_DIR"` before gunicorn. Without
+`METRICS_DIR` only the process answering the scrape is reported.
+'''
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from math import inf
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DURATION_BUCKETS = (
+    .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def merge(total, value):
+    '''Add a counter value or histogram bucket list into `total`.'''
+    if isinstance(value, list):
+        if total is None:
+            return list(value)
+        return [left + right for left, right in zip(total, value)]
+    return (total or 0) + value
+
+
+class Registry:
+    '''Metric definitions and this process' values.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.flushed_at = 0
+        self.flushes_on_exit = False
+        self.pid = None
+        self.process_id = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def check_process(self):
+        '''Give this process its own id on first use, forks included.
+
+        Values inherited from the parent at the fork are dropped: they
+        are the parent's, counted in its own file. Called with the lock.
+        '''
+        if self.pid != os.getpid():
+            if self.pid is not None:
+                self.values = {}
+            self.pid = os.getpid()
+            self.process_id = uuid.uuid4().hex
+
+    def update(self, key, function):
+        with self.lock:
+            self.check_process()
+            self.values[key] = function(self.values.get(key))
+        if settings.METRICS_DIR and (
+                time.monotonic() - self.flushed_at
+                >= settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def entries(self):
+        with self.lock:
+            self.check_process()
+            return [
+                [name, list(labels), merge(None, value)]
+                for (name, labels), value in self.values.items()]
+
+    def flush(self):
+        '''Write this process' values for the others to read.'''
+        if not settings.METRICS_DIR:
+            return
+        if not self.flushes_on_exit:
+            self.flushes_on_exit = True
+            atexit.register(self.flush)
+        self.flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        entries = self.entries()
+        path = os.path.join(
+            settings.METRICS_DIR, f'{self.process_id}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(entries, output)
+        # Readers see either the old file or the new one, never half.
+        os.replace(temporary, path)
+
+    def process_entries(self):
+        if not settings.METRICS_DIR:
+            yield self.entries()
+            return
+        self.flush()
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            try:
+                with open(path) as data:
+                    yield json.load(data)
+            except (OSError, ValueError):
+                continue
+
+    def collect(self):
+        '''`{(name, labels): value}` summed over the processes.'''
+        totals = {}
+        for entries in self.process_entries():
+            for name, labels, value in entries:
+                key = (name, tuple(labels))
+                totals[key] = merge(totals.get(key), value)
+        return totals
+
+    def exposition(self):
+        '''All metrics in the Prometheus text format.'''
+        samples = defaultdict(list)
+        for (name, labels), value in sorted(self.collect().items()):
+            samples[name].append((labels, value))
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in samples[name]:
+                labels = dict(zip(metric.labelnames, labels))
+                lines.extend(
+                    f'{sample}{format_labels(sample_labels)} '
+                    f'{format_value(sample_value)}'
+                    for sample, sample_labels, sample_value
+                    in metric.samples(labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value):
+    if value == inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items())
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def key(self, labels):
+        return (
+            self.name, tuple(str(labels[name]) for name in self.labelnames))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(
+            self.key(labels), lambda value: (value or 0) + amount)
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Histogram(Metric):
+    '''Counts per bucket (the last one is +Inf) followed by the sum.'''
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DURATION_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        index = bisect_left(self.buckets, value)
+
+        def add(counts):
+            counts = counts or [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+            return counts
+
+        self.registry.update(self.key(labels), add)
+
+    def samples(self, labels, counts):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, inf), counts):
+            cumulative += count
+            yield (
+                f'{self.name}_bucket', {**labels, 'le': format_value(bound)},
+                cumulative)
+        yield f'{self.name}_sum', labels, counts[-1]
+        yield f'{self.name}_count', labels, cumulative
+
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route, method and status.',
+    ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to answer an HTTP request.',
+    ('route', 'method'))
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run per HTTP request.',
+    ('route',), buckets=QUERY_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total', 'Cache lookups by cache and result (hit, miss).',
+    ('cache', 'result'))
+EXPORT_RENDER_DURATION = Histogram(
+    'export_render_duration_seconds',
+    'Time to render a shopping list export.', ('format',))
+
+
+def cache_hit(name, hit):
+    '''Count a hit or a miss of the `name` cache and return `hit`.'''
+    CACHE_LOOKUPS.inc(cache=name, result='hit' if hit else 'miss')
+    return hit
+
+
+def cache_lookup(name, value):
+    '''Count `cache.get()` returning `value` and return it unchanged.'''
+    cache_hit(name, value is not None)
+    return value
+
+
+def observe_export(export_format, started):
+    EXPORT_RENDER_DURATION.observe(
+        time.perf_counter() - started, format=export_format)
+
+
+def timed_chunks(export_format, chunks):
+    '''Yield `chunks`, observing the time spent producing them.
+
+    Time spent by the server sending a chunk is not included.
+    '''
+    spent = 0
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        finally:
+            spent += time.perf_counter() - started
+        yield chunk
+    EXPORT_RENDER_DURATION.observe(spent, format=export_format)
+
+
+def route_name(view_func, method):
+    '''`ViewSet.action` for DRF views, the view function name otherwise.'''
+    view_class = (
+        getattr(view_func, 'cls', None)
+        or getattr(view_func, 'view_class', None))
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    '''Count requests, their duration and SQL queries per route.
+
+    Requests no URL matched are counted under the `unmatched` route, so
+    scanners cannot blow up the number of series.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        route = getattr(request, 'metrics_route', 'unmatched')
+        method = request.method if request.method in METHODS else 'other'
+        REQUESTS.inc(route=route, method=method, status=response.status_code)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started, route=route, method=method)
+        REQUEST_QUERIES.observe(queries.count, route=route)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_route = route_name(
+            view_func, request.method.lower())
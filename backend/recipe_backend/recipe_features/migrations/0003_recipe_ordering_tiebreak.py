@@ -0,0 +1,17 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_features', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['-pud_date', '-id'], 'verbose_name': 'Recipe', 'verbose_name_plural': 'Recipes'},
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:56
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+POSTGRES_INDEXES = (
+    ('ingredient_lower_name_pattern_idx', 'recipe_features_ingredient',
+     'btree (lower(name) text_pattern_ops)'),
+    ('ingredient_lower_name_trgm_idx', 'recipe_features_ingredient',
+     'gin (lower(name) gin_trgm_ops)'),
+    ('recipe_lower_name_trgm_idx', 'recipe_features_recipe',
+     'gin (lower(name) gin_trgm_ops)'),
+)
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, definition in POSTGRES_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING {definition}')
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in POSTGRES_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_features', '0003_recipe_ordering_tiebreak'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='ingredient_lower_name_idx'),
+        ),
+        TrigramExtension(),
+        migrations.RunPython(
+            create_postgres_indexes, drop_postgres_indexes),
+    ]
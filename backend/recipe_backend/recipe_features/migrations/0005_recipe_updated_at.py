@@ -0,0 +1,20 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_features', '0004_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='date of last change'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipe_features', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipe_features', 'ShoppingListItem')
+    totals = RecipeIngredient.objects.filter(
+        recipe__purchases__isnull=False
+    ).values('recipe__purchases__user', 'ingredient').annotate(
+        total=Sum('amount')).filter(total__gt=0).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(
+            user_id=row['recipe__purchases__user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total'])
+         for row in totals.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe_features', '0005_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='total quantity of ingredient')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipe_features.ingredient', verbose_name='ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'ShoppingListItem',
+                'verbose_name_plural': 'ShoppingListItems',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='one shopping list row per ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 3.2.9 on 2026-10-18 21:05
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import DatabaseError, migrations
+
+# The SQL is copied here rather than imported from recipe_features.search,
+# so that later changes to that module do not change this migration.
+POSTGRES_CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipe_features_recipe USING gin (search_vector)')
+POSTGRES_DROP_INDEX = 'DROP INDEX IF EXISTS recipe_search_vector_idx'
+POSTGRES_FILL = (
+    'UPDATE recipe_features_recipe SET search_vector = '
+    "setweight(to_tsvector(%s::regconfig, recipe_features_recipe.name), 'A') "
+    "|| setweight(to_tsvector(%s::regconfig, coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipe_features_recipeingredient ri "
+    'JOIN recipe_features_ingredient i ON i.id = ri.ingredient_id '
+    "WHERE ri.recipe_id = recipe_features_recipe.id), '')), 'B') "
+    '|| setweight(to_tsvector(%s::regconfig, recipe_features_recipe.text), '
+    "'C')")
+
+SQLITE_CREATE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipe_features_recipe_fts '
+    'USING fts5(name, ingredients, text)')
+SQLITE_DROP_TABLE = 'DROP TABLE IF EXISTS recipe_features_recipe_fts'
+SQLITE_FILL = (
+    'INSERT INTO recipe_features_recipe_fts (rowid, name, ingredients, text) '
+    'SELECT recipe_features_recipe.id, recipe_features_recipe.name, '
+    "coalesce((SELECT group_concat(i.name, ' ') "
+    'FROM recipe_features_recipeingredient ri '
+    'JOIN recipe_features_ingredient i ON i.id = ri.ingredient_id '
+    "WHERE ri.recipe_id = recipe_features_recipe.id), ''), "
+    'recipe_features_recipe.text FROM recipe_features_recipe')
+
+
+def create_search_index(apps, schema_editor):
+    db = schema_editor.connection
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(POSTGRES_CREATE_INDEX)
+            config = settings.RECIPE_SEARCH_CONFIG
+            cursor.execute(POSTGRES_FILL, [config, config, config])
+        elif db.vendor == 'sqlite':
+            try:
+                cursor.execute(SQLITE_CREATE_TABLE)
+            except DatabaseError:
+                # SQLite without FTS5: search falls back to LIKE.
+                return
+            cursor.execute(SQLITE_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    db = schema_editor.connection
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(POSTGRES_DROP_INDEX)
+        elif db.vendor == 'sqlite':
+            cursor.execute(SQLITE_DROP_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_features', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.9 on 2026-10-18 21:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe_features', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pud_date', '-id'], name='recipe_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pud_date', '-id'], name='recipe_author_feed_idx'),
+        ),
+        # Dropped only once recipe_author_feed_idx covers author lookups.
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
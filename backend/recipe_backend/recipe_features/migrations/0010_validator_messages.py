@@ -0,0 +1,24 @@
+# Generated by Django 3.2.9 on 2026-10-18 21:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_features', '0009_recipe_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1, 'The cooking_time must be more than zero.'), django.core.validators.MaxValueValidator(1000, 'The cooking_time must be less than 1000.')], verbose_name='time of cooking'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='amount',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(0, 'The amount must be more than zero.'), django.core.validators.MaxValueValidator(10000, 'The amount must be less than 10000.')], verbose_name='quantity of ingredient'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from datetime import datetime
 
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import constraints
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch, Value,
+                              constraints)
 from django.db.models.functions import Lower
 
 from users.models import User
@@ -34,6 +36,8 @@ class Ingredient(models.Model):
         ordering = [Lower('name'), ]
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        indexes = [
+            models.Index(Lower('name'), name='ingredient_lower_name_idx')]
         constraints = [constraints.UniqueConstraint(
             fields=['name', 'measurement_unit'], name='prevention doubling')]
 
@@ -64,17 +68,58 @@ class RecipeIngredient(models.Model):
         verbose_name_plural = 'RecipeIngredients'
 
 
+class RecipeQuerySet(models.QuerySet):
+    '''Queryset that loads everything a recipe card needs up front.'''
+
+    def with_related(self):
+        return self.select_related('author').defer(
+            'search_vector').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')))
+
+    def with_user_flags(self, user):
+        '''Annotate per-user flags used by RecipeSerializer.'''
+        if user is None or user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false)
+        return self.annotate(
+            is_favorited=favorited_by(user),
+            is_in_shopping_cart=in_cart_of(user),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))))
+
+
+def favorited_by(user):
+    '''EXISTS on the (user, recipe) unique index of Favorite.'''
+    return Exists(Favorite.objects.filter(user=user, recipe=OuterRef('pk')))
+
+
+def in_cart_of(user):
+    '''EXISTS on the (user, purchase) unique index of Cart.'''
+    return Exists(Cart.objects.filter(user=user, purchase=OuterRef('pk')))
+
+
 class Recipe(models.Model):
     '''Model for Recipe'''
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name='ingredients',
         through=RecipeIngredient)
+    # Indexed by recipe_author_feed_idx, which starts with author.
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name='recipes')
+                               related_name='recipes', db_index=False)
     tags = models.ManyToManyField(
         Tag, verbose_name='tag')
     image = models.ImageField(
         verbose_name='image', upload_to='recipes/')
+    image_variants = models.JSONField(
+        verbose_name='resized copies of the image', default=dict,
+        blank=True, editable=False)
     name = models.CharField(
         verbose_name='name of dish',
         max_length=200)
@@ -88,15 +133,30 @@ class Recipe(models.Model):
         ])
     pud_date = models.DateTimeField(
         verbose_name='date of publication', default=datetime.now,)
+    updated_at = models.DateTimeField(
+        verbose_name='date of last change', auto_now=True)
+    # Weighted name, ingredient names and text, kept by
+    # recipe_features.search; Postgres only, SQLite uses an FTS5 table.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     STRING_METHOD_MESSAGE = (
         'name: {name}, author:{author}'
     )
 
     class Meta:
-        ordering = ['-pud_date']
+        ordering = ['-pud_date', '-id']
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            # The feed, newest first, and the same per author (?author=,
+            # subscriptions): pages are read off the index in order.
+            models.Index(fields=['-pud_date', '-id'], name='recipe_feed_idx'),
+            models.Index(
+                fields=['author', '-pud_date', '-id'],
+                name='recipe_author_feed_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.STRING_METHOD_MESSAGE.format(
@@ -125,6 +185,32 @@ class Cart(models.Model):
         return f"{self.user} want to buy {self.purchase}"
 
 
+class ShoppingListItem(models.Model):
+    '''Per-user sum of ingredient amounts over the recipes in the cart.
+
+    Kept in step with Cart and RecipeIngredient by
+    `recipe_features.shopping_list`.
+    '''
+    user = models.ForeignKey(
+        User, verbose_name='user', on_delete=models.CASCADE,
+        related_name='shopping_list')
+    ingredient = models.ForeignKey(
+        Ingredient, verbose_name='ingredient', on_delete=models.CASCADE,
+        related_name='shopping_list_items')
+    total_amount = models.PositiveIntegerField(
+        verbose_name='total quantity of ingredient')
+
+    class Meta:
+        verbose_name = 'ShoppingListItem'
+        verbose_name_plural = 'ShoppingListItems'
+        constraints = [constraints.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='one shopping list row per ingredient')]
+
+    def __str__(self) -> str:
+        return f"{self.user} needs {self.total_amount} of {self.ingredient}"
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User, verbose_name='user', on_delete=models.CASCADE,
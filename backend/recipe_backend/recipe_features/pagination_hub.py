@@ -1,6 +1,90 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 100
+
+
+class RecipeKeysetPagination(BasePagination):
+    '''Keyset (cursor) pagination for the recipe feed.
+
+    Pages are sliced on the `Recipe.Meta.ordering` key (-pud_date, -id)
+    instead of OFFSET, so there is no COUNT(*) and deep pages cost the
+    same as the first one. Recipes published while a client scrolls
+    sort before the cursor and never shift the following pages.
+
+    Opt in by passing `cursor` (empty for the first page); the response
+    carries the `next` link with the cursor of the following page.
+    '''
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pud_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pud_date, pk = position
+            queryset = queryset.filter(
+                Q(pud_date__lt=pud_date) | Q(id__lt=pk),
+                pud_date__lte=pud_date)
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pud_date, pk = urlsafe_b64decode(
+                encoded.encode('ascii')).decode('ascii').split('|')
+            pud_date, pk = parse_datetime(pud_date), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pud_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pud_date, pk
+
+    def encode_cursor(self, recipe):
+        position = f'{recipe.pud_date.isoformat()}|{recipe.pk}'
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,224 @@
+'''Opt-in request profiling: SQL, serializer time and N+1 detection.
+
+With `PROFILING_ENABLED` every request records its queries through
+`connection.execute_wrapper` and the time spent in `serializer.data`,
+timed by a patch of `BaseSerializer.data` that is only in place while
+profiled requests are running.
+The totals go out in a `Server-Timing` header, and requests slower than
+`PROFILING_SLOW_REQUEST_MS` are kept in a per-process ring buffer that
+admins read from /api/profiling/requests/.
+'''
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+SPACE = re.compile(r'\s+')
+# Groups shown per request in the ring buffer.
+TOP_GROUPS = 5
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def fingerprint(sql):
+    '''SQL with literals and placeholders as `?`, IN lists as `(...)`.
+
+    Queries differing only in their parameters share a fingerprint, so
+    a loop of lookups shows up as one fingerprint run many times.
+    '''
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = IN_LIST.sub('(...)', sql)
+    return SPACE.sub(' ', sql).strip()
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+class RequestProfile:
+    '''What one request spent on SQL and serialization.'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, repr(params), time.perf_counter() - started))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        '''The same SQL with the same parameters, run more than once.'''
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return [
+            {'sql': sql, 'count': count}
+            for (sql, _), count in counts.most_common(TOP_GROUPS)
+            if count > 1]
+
+    def similar(self):
+        '''Fingerprints run at least PROFILING_SIMILAR_QUERIES times.'''
+        groups = defaultdict(list)
+        for sql, _, duration in self.queries:
+            groups[fingerprint(sql)].append(duration)
+        similar = [
+            {'fingerprint': key, 'count': len(durations),
+             'db_ms': milliseconds(sum(durations))}
+            for key, durations in groups.items()
+            if len(durations) >= settings.PROFILING_SIMILAR_QUERIES]
+        similar.sort(key=lambda group: group['count'], reverse=True)
+        return similar[:TOP_GROUPS]
+
+    def server_timing(self, total):
+        similar = len(self.similar())
+        metrics = [
+            f'total;dur={milliseconds(total)}',
+            f'db;dur={milliseconds(self.db_time)};'
+            f'desc="{len(self.queries)} queries"',
+            f'serializer;dur={milliseconds(self.serializer_time)}',
+        ]
+        if similar:
+            metrics.append(f'n-plus-one;desc="{similar} similar groups"')
+        return ', '.join(metrics)
+
+    def as_dict(self, request, response, total):
+        match = request.resolver_match
+        return {
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': milliseconds(total),
+            'db_ms': milliseconds(self.db_time),
+            'serializer_ms': milliseconds(self.serializer_time),
+            'queries': len(self.queries),
+            'duplicates': self.duplicates(),
+            'similar': self.similar(),
+        }
+
+
+class RingBuffer:
+    '''The last `size` slow requests of this process.'''
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.items = deque(maxlen=size)
+
+    def append(self, item):
+        with self.lock:
+            self.items.append(item)
+
+    def slowest(self):
+        with self.lock:
+            items = list(self.items)
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+slow_requests = RingBuffer(settings.PROFILING_BUFFER_SIZE)
+
+_serializer_data = BaseSerializer.data
+
+
+def profiled_data(serializer):
+    '''`BaseSerializer.data`, timed when a request is being profiled.
+
+    Serializers reading `.data` of other serializers (method fields) are
+    counted once, as part of the outermost one.
+    '''
+    profile = current_profile.get()
+    if profile is None or profile.serializer_depth:
+        return _serializer_data.fget(serializer)
+    profile.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return _serializer_data.fget(serializer)
+    finally:
+        profile.serializer_depth -= 1
+        profile.serializer_time += time.perf_counter() - started
+
+
+class SerializerTiming:
+    '''Reversible patch of `BaseSerializer.data` with `profiled_data`.
+
+    Entered by every profiled request: the patch goes in with the first
+    one running and the original property is put back after the last,
+    so serializers outside profiled requests run DRF's code untouched.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+    def __enter__(self):
+        with self.lock:
+            if not self.users:
+                BaseSerializer.data = property(profiled_data)
+            self.users += 1
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.users -= 1
+            if not self.users:
+                BaseSerializer.data = _serializer_data
+
+
+serializer_timing = SerializerTiming()
+
+
+class ProfilingMiddleware:
+    '''Profile each request, see the module docstring.
+
+    Not loaded at all unless `PROFILING_ENABLED`, so it costs nothing
+    when switched off.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(serializer_timing)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        # Streamed bodies query while they are sent, after the headers:
+        # those queries are not counted.
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        if milliseconds(total) >= settings.PROFILING_SLOW_REQUEST_MS:
+            slow_requests.append(profile.as_dict(request, response, total))
+        return response
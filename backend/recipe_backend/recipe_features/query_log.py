@@ -0,0 +1,191 @@
+'''Sampled SQL log, ranked by `manage.py analyze-query-log`.
+
+With `QUERY_LOG_ENABLED`, one request in `1 / QUERY_LOG_SAMPLE_RATE`
+has each of its queries taking at least `QUERY_LOG_MIN_MS` written as a
+JSON line: its fingerprint (see profiling.fingerprint), duration, the
+view action and the serializer method and project line that ran it.
+Parameters are never written. Every process appends to its own
+`QUERY_LOG_DIR/queries-<pid>.jsonl`, rotated at `QUERY_LOG_MAX_BYTES`
+with `QUERY_LOG_BACKUPS` old files kept.
+'''
+import glob
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+
+from recipe_features.metrics import route_name
+from recipe_features.profiling import fingerprint
+
+LOG_NAME = 'queries-{pid}.jsonl'
+LOG_FILES = 'queries-*.jsonl*'
+# Enough to tell queries apart, a fingerprint with a huge IN list is cut.
+MAX_SQL_LENGTH = 2000
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def get_handler():
+    '''This process' rotating log file, opened on first use.
+
+    Keyed by pid, so workers forked after a write get files of their own.
+    '''
+    path = os.path.join(
+        settings.QUERY_LOG_DIR, LOG_NAME.format(pid=os.getpid()))
+    with _handlers_lock:
+        if path not in _handlers:
+            os.makedirs(settings.QUERY_LOG_DIR, exist_ok=True)
+            _handlers[path] = RotatingFileHandler(
+                path, maxBytes=settings.QUERY_LOG_MAX_BYTES,
+                backupCount=settings.QUERY_LOG_BACKUPS, encoding='utf-8',
+                delay=True)
+        return _handlers[path]
+
+
+def write(entry):
+    get_handler().handle(logging.makeLogRecord({'msg': json.dumps(entry)}))
+
+
+def is_project_code(filename):
+    return (
+        filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in filename
+        and filename != __file__)
+
+
+def call_site(frame):
+    '''`(serializer method, project line)` of the code running a query.
+
+    The serializer method is the innermost one defined in the project,
+    like `RecipeSerializer.favorite`; DRF's own methods are only used
+    when no project serializer is on the stack.
+    '''
+    serializer = fallback = caller = None
+    while frame is not None and not (serializer and caller):
+        code = frame.f_code
+        in_project = is_project_code(code.co_filename)
+        if caller is None and in_project:
+            caller = '{}:{} {}'.format(
+                os.path.relpath(code.co_filename, settings.BASE_DIR),
+                frame.f_lineno, code.co_name)
+        instance = frame.f_locals.get('self')
+        if serializer is None and isinstance(instance, BaseSerializer):
+            name = f'{type(instance).__name__}.{code.co_name}'
+            if in_project:
+                serializer = name
+            elif fallback is None:
+                fallback = name
+        frame = frame.f_back
+    return serializer or fallback, caller
+
+
+class QueryLogger:
+    '''Execute wrapper writing the queries of one sampled request.'''
+
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.QUERY_LOG_MIN_MS:
+                self.log(sql, many, duration)
+
+    def log(self, sql, many, duration):
+        serializer, caller = call_site(sys._getframe(2))
+        write({
+            'at': timezone.now().isoformat(),
+            'fingerprint': fingerprint(sql)[:MAX_SQL_LENGTH],
+            'ms': round(duration, 3),
+            'many': many,
+            'view': getattr(self.request, 'query_log_view', None),
+            'serializer': serializer,
+            'caller': caller,
+        })
+
+
+class QueryLogMiddleware:
+    '''Log the queries of a sample of the requests, see the module.'''
+
+    def __init__(self, get_response):
+        if not settings.QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_LOG_SAMPLE_RATE:
+            return self.get_response(request)
+        logger = QueryLogger(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(logger))
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_log_view = route_name(
+            view_func, request.method.lower())
+
+
+def log_files(directory):
+    '''The logs of every process, rotated ones included.'''
+    return sorted(glob.glob(os.path.join(directory, LOG_FILES)))
+
+
+def read_entries(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # The last line of a process killed while writing.
+                    continue
+
+
+def percentile(values, fraction):
+    '''Nearest-rank percentile of sorted `values`.'''
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def aggregate(entries, top_sites=3):
+    '''Total time, calls, p95 and main call sites per fingerprint.
+
+    Sorted by total time, the most expensive fingerprint first.
+    '''
+    durations = defaultdict(list)
+    sites = defaultdict(Counter)
+    for entry in entries:
+        key = entry['fingerprint']
+        durations[key].append(entry['ms'])
+        sites[key][
+            (entry['view'], entry['serializer'], entry['caller'])] += 1
+    report = []
+    for key, values in durations.items():
+        values.sort()
+        report.append({
+            'fingerprint': key,
+            'calls': len(values),
+            'total_ms': round(sum(values), 3),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p95_ms': percentile(values, .95),
+            'sites': sites[key].most_common(top_sites),
+        })
+    report.sort(key=lambda row: row['total_ms'], reverse=True)
+    return report
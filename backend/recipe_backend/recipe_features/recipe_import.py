@@ -0,0 +1,341 @@
+import json
+import os
+import tarfile
+import zipfile
+from functools import partial
+from itertools import islice
+
+from django.core.files import File
+from django.core.validators import get_available_image_extensions
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipe_features.conditional import RECIPES, mark_changed_on_commit
+from recipe_features.images import queue_variants
+from recipe_features.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipe_features.search import schedule_refresh
+from users.models import User
+
+MAX_COOKING_TIME = 1000
+MAX_AMOUNT = 10000
+IMAGE_EXTENSIONS = {
+    extension.lower() for extension in get_available_image_extensions()}
+
+
+def parse_pud_date(value):
+    '''ISO 8601 datetime; without an offset it is in TIME_ZONE.'''
+    parsed = parse_datetime(value)
+    if parsed is not None and timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    return parsed
+
+
+def lookup(mapping, key):
+    '''`mapping.get(key)` that tolerates unhashable JSON values.'''
+    try:
+        return mapping.get(key)
+    except TypeError:
+        return None
+
+
+class ImageDirectory:
+    '''Images referenced by relative path inside a folder.'''
+
+    def __init__(self, path):
+        self.root = os.path.realpath(path)
+
+    def path(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def exists(self, name):
+        path = self.path(name)
+        return path is not None and os.path.isfile(path)
+
+    def open(self, name):
+        return open(self.path(name), 'rb')
+
+    def close(self):
+        pass
+
+
+class ImageArchive:
+    '''Images referenced by member name inside a zip or tar archive.'''
+
+    def __init__(self, archive):
+        if zipfile.is_zipfile(archive):
+            self.zip = zipfile.ZipFile(archive)
+            self.tar = None
+            self.names = {
+                info.filename for info in self.zip.infolist()
+                if not info.is_dir()}
+            return
+        if hasattr(archive, 'seek'):
+            archive.seek(0)
+            self.tar = tarfile.open(fileobj=archive)
+        else:
+            self.tar = tarfile.open(archive)
+        self.zip = None
+        self.names = {
+            member.name for member in self.tar.getmembers()
+            if member.isfile()}
+
+    def exists(self, name):
+        return name in self.names
+
+    def open(self, name):
+        if self.zip is not None:
+            return self.zip.open(name)
+        return self.tar.extractfile(name)
+
+    def close(self):
+        (self.zip or self.tar).close()
+
+
+def open_images(source):
+    '''Image source for a folder path, an archive path or an upload.'''
+    if isinstance(source, str) and os.path.isdir(source):
+        return ImageDirectory(source)
+    return ImageArchive(source)
+
+
+def delete_images(rows):
+    '''Delete the stored images of rows that were not written.'''
+    for _, (recipe, _, _, _) in rows:
+        recipe.image.delete(save=False)
+
+
+class RecipeImporter:
+    '''Bulk import of recipes from NDJSON lines.
+
+    Every line is a recipe in the shape of the create API, with `image`
+    naming a file of the image source instead of base64 data::
+
+        {"name": "Pie", "text": "...", "cooking_time": 30,
+         "tags": [1, "dinner"], "image": "pie.jpg", "author": "admin",
+         "ingredients": [{"id": 7, "amount": 200}]}
+
+    Tags may be given by id or slug, ingredients by `id` or by `name`
+    and `measurement_unit`, the author by id or username (defaults to
+    `default_author`). References are checked against maps loaded up
+    front, so validation runs no queries per row. Valid rows are written
+    `chunk_size` at a time with bulk_create, one transaction per chunk;
+    invalid rows are reported in `errors` as `(line, message)` and
+    skipped. Images are copied to the media storage just before their
+    chunk is written, and deleted again for the rows that could not be.
+    '''
+
+    def __init__(self, images=None, default_author=None, chunk_size=500):
+        self.images = images
+        self.default_author = default_author
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors = []
+        self.tags = {}
+        for tag in Tag.objects.all():
+            self.tags[tag.pk] = self.tags[tag.slug] = tag
+        self.ingredients = {}
+        for pk, name, unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit').iterator():
+            self.ingredients[pk] = self.ingredients[(name, unit)] = pk
+        self.authors = {}
+
+    def run(self, lines):
+        lines = enumerate(lines, start=1)
+        chunk = list(islice(lines, self.chunk_size))
+        while chunk:
+            self.import_chunk(chunk)
+            chunk = list(islice(lines, self.chunk_size))
+        return self
+
+    def import_chunk(self, chunk):
+        rows = self.parse(chunk)
+        self.load_authors(row for _, row in rows)
+        valid = []
+        for number, row in rows:
+            errors, recipe = self.validate(row)
+            if errors:
+                self.errors.append((number, '; '.join(errors)))
+            else:
+                valid.append((number, recipe))
+        valid = self.store_images(valid)
+        if not valid:
+            return
+        try:
+            with transaction.atomic():
+                self.write(valid)
+            self.created += len(valid)
+        except DatabaseError:
+            self.write_one_by_one(valid)
+        except Exception:
+            delete_images(valid)
+            raise
+
+    def parse(self, chunk):
+        rows = []
+        for number, line in chunk:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                rows.append((number, json.loads(line)))
+            except ValueError as error:
+                self.errors.append((number, f'Invalid JSON: {error}'))
+        return rows
+
+    def load_authors(self, rows):
+        wanted = {
+            row.get('author') for row in rows
+            if isinstance(row, dict)
+            and isinstance(row.get('author'), (int, str))}
+        wanted -= self.authors.keys()
+        ids = {author for author in wanted if isinstance(author, int)}
+        usernames = {author for author in wanted if isinstance(author, str)}
+        if not ids and not usernames:
+            return
+        for user in User.objects.filter(pk__in=ids) | User.objects.filter(
+                username__in=usernames):
+            self.authors[user.pk] = self.authors[user.username] = user
+
+    def validate(self, row):
+        '''Return `(errors, None)` or `([], (recipe, image, tags, links))`.'''
+        if not isinstance(row, dict):
+            return ['A recipe must be a JSON object.'], None
+        errors = []
+        author = self.validate_fields(row, errors)
+        tags = self.validate_tags(row.get('tags'), errors)
+        links = self.validate_ingredients(row.get('ingredients'), errors)
+        self.validate_image(row.get('image'), errors)
+        if errors:
+            return errors, None
+        recipe = Recipe(
+            author=author, name=row['name'], text=row['text'],
+            cooking_time=row['cooking_time'])
+        if row.get('pud_date') is not None:
+            recipe.pud_date = parse_pud_date(row['pud_date'])
+        return [], (recipe, row['image'], tags, links)
+
+    def validate_fields(self, row, errors):
+        for field in ('name', 'text'):
+            if not isinstance(row.get(field), str) or not row[field].strip():
+                errors.append(f'{field}: required field.')
+        cooking_time = row.get('cooking_time')
+        if (not isinstance(cooking_time, int)
+                or not 1 <= cooking_time <= MAX_COOKING_TIME):
+            errors.append(
+                f'cooking_time: must be from 1 to {MAX_COOKING_TIME}.')
+        author = self.default_author
+        if row.get('author') is not None:
+            author = lookup(self.authors, row['author'])
+        if author is None:
+            errors.append(f'author: unknown user {row.get("author")}.')
+        pud_date = row.get('pud_date')
+        if pud_date is not None and (
+                not isinstance(pud_date, str) or parse_datetime(
+                    pud_date) is None):
+            errors.append('pud_date: must be an ISO 8601 datetime.')
+        return author
+
+    def validate_tags(self, tags, errors):
+        if not tags or not isinstance(tags, list):
+            errors.append('tags: required field.')
+            return []
+        unknown = [tag for tag in tags if lookup(self.tags, tag) is None]
+        if unknown:
+            errors.append(f'tags: unknown {unknown}.')
+            return []
+        tags = [self.tags[tag] for tag in tags]
+        if len({tag.pk for tag in tags}) != len(tags):
+            errors.append('tags: must be unique.')
+        return tags
+
+    def validate_ingredients(self, ingredients, errors):
+        if not ingredients or not isinstance(ingredients, list):
+            errors.append('ingredients: required field.')
+            return {}
+        links = {}
+        for ingredient in ingredients:
+            if not isinstance(ingredient, dict):
+                errors.append('ingredients: items must be objects.')
+                continue
+            key = ingredient.get('id')
+            if key is None:
+                key = (ingredient.get('name'),
+                       ingredient.get('measurement_unit'))
+            pk = lookup(self.ingredients, key)
+            amount = ingredient.get('amount')
+            if pk is None:
+                errors.append(f'ingredients: unknown {key}.')
+            elif pk in links:
+                errors.append(f'ingredients: {key} is repeated.')
+            elif (not isinstance(amount, int)
+                  or not 0 < amount <= MAX_AMOUNT):
+                errors.append(
+                    f'ingredients: amount of {key} must be from 1 '
+                    f'to {MAX_AMOUNT}.')
+            else:
+                links[pk] = amount
+        return links
+
+    def validate_image(self, image, errors):
+        if not isinstance(image, str) or not image:
+            errors.append('image: required field.')
+        elif self.images is None or not self.images.exists(image):
+            errors.append(f'image: {image} is not in the image source.')
+        elif os.path.splitext(image)[1][1:].lower() not in IMAGE_EXTENSIONS:
+            errors.append(f'image: {image} is not an image.')
+
+    def store_images(self, valid):
+        '''Copy the images to the media storage, dropping unreadable rows.'''
+        stored = []
+        for number, recipe in valid:
+            instance, image = recipe[:2]
+            try:
+                with self.images.open(image) as f:
+                    instance.image.save(
+                        os.path.basename(image), File(f), save=False)
+            except (OSError, KeyError, zipfile.BadZipFile,
+                    tarfile.TarError) as error:
+                self.errors.append((number, f'image: {error}'))
+            else:
+                stored.append((number, recipe))
+        return stored
+
+    def write_one_by_one(self, valid):
+        '''Find the rows the database refuses and keep the others.'''
+        for number, recipe in valid:
+            recipe[0].pk = None
+            recipe[0]._state.adding = True
+            try:
+                with transaction.atomic():
+                    self.write([(number, recipe)])
+                self.created += 1
+            except DatabaseError as error:
+                delete_images([(number, recipe)])
+                self.errors.append((number, str(error)))
+
+    def write(self, valid):
+        recipes = [recipe for _, (recipe, _, _, _) in valid]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create skips post_save, which queues the variants
+            # and the search refresh.
+            transaction.on_commit(partial(
+                queue_variants, [recipe.pk for recipe in recipes]))
+            schedule_refresh(recipe.pk for recipe in recipes)
+            mark_changed_on_commit(RECIPES)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for _, (recipe, _, tags, _) in valid for tag in tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for _, (recipe, _, _, links) in valid
+            for ingredient_id, amount in links.items())
@@ -0,0 +1,169 @@
+import re
+from functools import partial
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from recipe_features.models import RecipeIngredient
+
+RECIPE_TABLE = 'recipe_features_recipe'
+FTS_TABLE = 'recipe_features_recipe_fts'
+POSTGRES_INDEX = 'recipe_search_vector_idx'
+# Relative weights of the name, the ingredient names and the text.
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+REFRESH_CHUNK = 500
+
+INGREDIENT_NAMES = (
+    'SELECT {aggregate} FROM recipe_features_recipeingredient ri '
+    'JOIN recipe_features_ingredient i ON i.id = ri.ingredient_id '
+    f'WHERE ri.recipe_id = {RECIPE_TABLE}.id')
+
+POSTGRES_REFRESH = (
+    f'UPDATE {RECIPE_TABLE} SET search_vector = '
+    f"setweight(to_tsvector(%s::regconfig, {RECIPE_TABLE}.name), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, coalesce(("
+    + INGREDIENT_NAMES.format(aggregate="string_agg(i.name, ' ')")
+    + "), '')), 'B') || "
+    f"setweight(to_tsvector(%s::regconfig, {RECIPE_TABLE}.text), 'C')")
+
+SQLITE_REFRESH = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+    f'SELECT {RECIPE_TABLE}.id, {RECIPE_TABLE}.name, coalesce(('
+    + INGREDIENT_NAMES.format(aggregate="group_concat(i.name, ' ')")
+    + f"), ''), {RECIPE_TABLE}.text FROM {RECIPE_TABLE}")
+
+
+def fts_available(db=connection):
+    '''Whether the FTS5 table was created (SQLite built with FTS5).'''
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            (FTS_TABLE,))
+        return cursor.fetchone() is not None
+
+
+def create_index(db=connection):
+    '''Create the search index of the backend and fill it.'''
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} '
+                f'ON {RECIPE_TABLE} USING gin (search_vector)')
+        elif db.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                    'USING fts5(name, ingredients, text)')
+            except DatabaseError:
+                # SQLite without FTS5: search falls back to LIKE.
+                return
+    refresh(db=db)
+
+
+def drop_index(db=connection):
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {POSTGRES_INDEX}')
+        elif db.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def refresh(recipe_ids=None, db=connection):
+    '''Rebuild the search document of the given recipes (all by default).
+
+    The document is the recipe name, the names of its ingredients and
+    the text; a stored tsvector column on Postgres, a row of the FTS5
+    table on SQLite.
+    '''
+    if recipe_ids is None:
+        chunks = [None]
+    else:
+        recipe_ids = sorted(set(recipe_ids))
+        chunks = [
+            recipe_ids[start:start + REFRESH_CHUNK]
+            for start in range(0, len(recipe_ids), REFRESH_CHUNK)]
+    if db.vendor == 'postgresql':
+        refresh_chunk = refresh_postgres
+    elif fts_available(db):
+        refresh_chunk = refresh_sqlite
+    else:
+        return
+    with db.cursor() as cursor:
+        for chunk in chunks:
+            refresh_chunk(cursor, chunk)
+
+
+def refresh_postgres(cursor, recipe_ids):
+    config = settings.RECIPE_SEARCH_CONFIG
+    params = [config, config, config]
+    sql = POSTGRES_REFRESH
+    if recipe_ids is not None:
+        sql += f' WHERE {RECIPE_TABLE}.id = ANY(%s)'
+        params.append(recipe_ids)
+    cursor.execute(sql, params)
+
+
+def refresh_sqlite(cursor, recipe_ids):
+    if recipe_ids is None:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(SQLITE_REFRESH)
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    cursor.execute(
+        f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+        recipe_ids)
+    cursor.execute(
+        f'{SQLITE_REFRESH} WHERE {RECIPE_TABLE}.id IN ({placeholders})',
+        recipe_ids)
+
+
+def schedule_refresh(recipe_ids):
+    '''Refresh the recipes once the current transaction commits.
+
+    By then the recipe, its ingredient links and renamed ingredients
+    are all written, however many statements it took.
+    '''
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(partial(refresh, recipe_ids))
+
+
+def fts_match(term):
+    '''Quote every word, FTS5 syntax in the user input is not interpreted.'''
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""'))
+        for word in re.findall(r'\w+', term))
+
+
+def search(queryset, term):
+    '''Recipes matching `term`, annotated with `search_rank`.'''
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            term, config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    if fts_available():
+        match = fts_match(term)
+        if not match:
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField()))
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )).annotate(search_rank=RawSQL(
+            # bm25() is lower for better matches.
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {RECIPE_TABLE}.id',
+            (match,), output_field=FloatField()))
+    return queryset.filter(
+        Q(name__icontains=term) | Q(text__icontains=term)
+        | Q(id__in=RecipeIngredient.objects.filter(
+            ingredient__name__icontains=term).values('recipe'))
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
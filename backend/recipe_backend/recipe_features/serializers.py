@@ -1,13 +1,54 @@
-from drf_extra_fields.fields import Base64ImageField
+import json
+
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
+from rest_framework.utils import html
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipe_features import shopping_list
+from recipe_features.images import variant_url, variant_urls
 from recipe_features.models import (Cart, Favorite, Ingredient, Recipe,
                                     RecipeIngredient, Tag)
+from recipe_features.signals import recipe_ingredient_signals_muted
+from recipe_features.uploads import RecipeImageField
 from users.serializers_user import CustomUserSerializer
 
 
+def resolve_ids(queryset, ids):
+    '''Fetch `{pk: object}` for `ids` in one query, or report every miss.'''
+    found = queryset.in_bulk(set(ids))
+    missing = sorted(set(ids) - found.keys())
+    if missing:
+        raise serializers.ValidationError(
+            f'Invalid pk {", ".join(map(str, missing))} - '
+            f'object does not exist.')
+    return found
+
+
+class PrimaryKeyListField(serializers.ListField):
+    '''List of primary keys resolved with a single `id__in` query.
+
+    Unlike `PrimaryKeyRelatedField(many=True)`, which runs a SELECT per
+    item during validation.
+    '''
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        found = resolve_ids(self.queryset, ids)
+        return [found[pk] for pk in ids]
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return [obj.pk for obj in data]
+
+
 class TagsSerializes(serializers.ModelSerializer):
     '''Serializer for tags.'''
     class Meta:
@@ -36,15 +77,27 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
+class PostRecipeIngredientListSerializer(serializers.ListSerializer):
+    '''Resolves the ingredient ids of all items in one query.'''
+
+    def validate(self, attrs):
+        found = resolve_ids(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in attrs])
+        for ingredient in attrs:
+            ingredient['id'] = found[ingredient['id']]
+        return attrs
+
+
 class PostRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = (
             'id', 'amount'
         )
+        list_serializer_class = PostRecipeIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -54,17 +107,27 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     ingredients = serializers.SerializerMethodField(read_only=True)
     image = serializers.SerializerMethodField(read_only=True)
+    images = serializers.SerializerMethodField(read_only=True)
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField('favorite')
     is_in_shopping_cart = serializers.SerializerMethodField('shopping_list')
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def favorite(self, instance):
+        if hasattr(instance, 'is_favorited'):
+            return instance.is_favorited
         if not instance or self.context['request'].user.is_anonymous:
             return False
         return Favorite.objects.filter(
             user=self.context['request'].user.id, recipe=instance.id).exists()
 
     def shopping_list(self, instance):
+        if hasattr(instance, 'is_in_shopping_cart'):
+            return instance.is_in_shopping_cart
         if not instance or self.context['request'].user.is_anonymous:
             return False
         return Cart.objects.filter(
@@ -72,30 +135,30 @@ class RecipeSerializer(serializers.ModelSerializer):
             purchase=instance.id).exists()
 
     def get_ingredients(self, instance):
-        ingredients = RecipeIngredient.objects.filter(recipe=instance)
+        ingredients = instance.recipe_ingredients.all()
         return RecipeIngredientSerializer(ingredients, many=True).data
 
     def get_image(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
+        return variant_url(obj, self.context.get('image_variant', 'full'))
+
+    def get_images(self, obj):
+        return variant_urls(obj)
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'image', 'tags', 'author', 'name', 'text', 'cooking_time',
-            'ingredients', 'is_favorited', 'is_in_shopping_cart')
+            'id', 'image', 'images', 'tags', 'author', 'name', 'text',
+            'cooking_time', 'ingredients', 'is_favorited',
+            'is_in_shopping_cart')
         required_fields = [
             'ingredients', 'tags', 'image', 'name', 'text', 'cooking_time']
 
 
 class PostRecipeSerializer(serializers.ModelSerializer):
     '''Serializer for creating or updating recipes'''
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     ingredients = PostRecipeIngredientSerializer(many=True)
-    image = Base64ImageField(required=False, use_url=True, max_length=None)
+    image = RecipeImageField(required=False, use_url=True, max_length=None)
 
     class Meta:
         model = Recipe
@@ -105,12 +168,92 @@ class PostRecipeSerializer(serializers.ModelSerializer):
         required_fields = [
             'ingredients', 'tags', 'image', 'name', 'text', 'cooking_time']
 
+    def __init__(self, *args, **kwargs):
+        if html.is_html_input(kwargs.get('data')):
+            kwargs['data'] = self.parse_form(kwargs['data'])
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def parse_form(data):
+        '''Turn a multipart form into the shape of the JSON body.
+
+        Tags are repeated `tags` fields, ingredients either one JSON
+        encoded `ingredients` field or `ingredients[0]id`,
+        `ingredients[0]amount`, ... fields.
+        '''
+        parsed = {
+            key: data.get(key) for key in data
+            if key not in ('tags', 'ingredients') and '[' not in key}
+        parsed['tags'] = data.getlist('tags') or html.parse_html_list(
+            data, prefix='tags', default=[])
+        ingredients = data.get('ingredients')
+        if ingredients:
+            try:
+                parsed['ingredients'] = json.loads(ingredients)
+            except ValueError:
+                parsed['ingredients'] = ingredients
+        else:
+            parsed['ingredients'] = [
+                dict(ingredient.items()) for ingredient in
+                html.parse_html_list(data, prefix='ingredients', default=[])]
+        return parsed
+
     def add_ingredients(self, list_of_obj, recipe):
-        for ingredient in list_of_obj:
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 ingredient=ingredient['id'], amount=ingredient['amount'],
-                recipe=recipe
-            )
+                recipe=recipe)
+            for ingredient in list_of_obj)
+
+    def add_tags(self, tags, recipe):
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag) for tag in tags)
+
+    def update_tags(self, tags, recipe):
+        '''Insert and delete only the tag links that changed.'''
+        through = Recipe.tags.through
+        current = set(through.objects.filter(
+            recipe=recipe).values_list('tag', flat=True))
+        wanted = {tag.pk: tag for tag in tags}
+        removed = current - wanted.keys()
+        if removed:
+            through.objects.filter(recipe=recipe, tag__in=removed).delete()
+        self.add_tags(
+            [tag for pk, tag in wanted.items() if pk not in current], recipe)
+
+    def update_ingredients(self, list_of_obj, recipe):
+        '''Bulk insert, update and delete only the rows that changed.
+
+        The per-row RecipeIngredient signals are muted; the shopping lists
+        of the carts holding the recipe get one batch of deltas instead.
+        '''
+        current = {
+            link.ingredient_id: link
+            for link in RecipeIngredient.objects.filter(recipe=recipe)}
+        wanted = {
+            ingredient['id'].pk: ingredient for ingredient in list_of_obj}
+        deltas = {}
+        to_create, to_update = [], []
+        for pk, ingredient in wanted.items():
+            link = current.get(pk)
+            if link is None:
+                to_create.append(ingredient)
+                deltas[pk] = ingredient['amount']
+            elif link.amount != ingredient['amount']:
+                deltas[pk] = ingredient['amount'] - link.amount
+                link.amount = ingredient['amount']
+                to_update.append(link)
+        removed = [
+            link for pk, link in current.items() if pk not in wanted]
+        for link in removed:
+            deltas[link.ingredient_id] = -link.amount
+        with recipe_ingredient_signals_muted():
+            if removed:
+                RecipeIngredient.objects.filter(
+                    pk__in=[link.pk for link in removed]).delete()
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+            self.add_ingredients(to_create, recipe)
+        shopping_list.recipe_ingredients_changed(recipe.pk, deltas)
 
     def validate(self, attrs):
         tags = self.initial_data.get('tags')
@@ -143,28 +286,34 @@ class PostRecipeSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.add_ingredients(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self.add_tags(tags, recipe)
+            self.add_ingredients(ingredients, recipe)
         return recipe
 
     def update(self, instance, validated_data):
-
-        val_tags = validated_data.pop('tags')
-        val_ingredients = validated_data.pop('ingredients')
-        if instance.tags != val_tags:
-            instance.tags.set(val_tags)
-        if instance.ingredients != val_ingredients:
-            RecipeIngredient.objects.filter(recipe=instance).all().delete()
-            self.add_ingredients(val_ingredients, instance)
-        return super().update(instance, validated_data)
+        val_tags = validated_data.pop('tags', None)
+        val_ingredients = validated_data.pop('ingredients', None)
+        with transaction.atomic():
+            if val_tags is not None:
+                self.update_tags(val_tags, instance)
+            if val_ingredients is not None:
+                self.update_ingredients(val_ingredients, instance)
+            # Saving the recipe moves `updated_at` for the link changes too.
+            return super().update(instance, validated_data)
 
 
 class RecipeViewSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_image(self, obj):
+        return variant_url(obj, 'thumb')
+
 
 class FavoriteSerializer(serializers.ModelSerializer):
     user = SlugRelatedField(
@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from recipe_features.models import Cart, RecipeIngredient, ShoppingListItem
+from users.models import User
+
+
+def apply_deltas(deltas):
+    '''Add `{(user_id, ingredient_id): delta}` to the shopping lists.
+
+    Every change of a cart, or of the ingredients of a carted recipe, is
+    turned into such deltas and applied in the caller's transaction, so
+    the download reads ready totals instead of summing RecipeIngredient
+    over the whole cart.
+    '''
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = sorted({user_id for user_id, _ in deltas})
+    with transaction.atomic():
+        # Lock the owners so concurrent changes of one list serialize.
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.filter(
+                user__in=user_ids,
+                ingredient__in={ingredient for _, ingredient in deltas})}
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        total_amount=delta))
+                continue
+            item.total_amount += delta
+            if item.total_amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ['total_amount'])
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def recipe_in_cart(user_id, recipe_id, sign=1):
+    '''Add (sign=1) or remove (sign=-1) a recipe from a user's list.'''
+    apply_deltas({
+        (user_id, ingredient_id): sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe=recipe_id).values_list('ingredient', 'amount')})
+
+
+def recipe_ingredients_changed(recipe_id, ingredient_deltas):
+    '''Spread `{ingredient_id: delta}` of a recipe over its carts.'''
+    ingredient_deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in ingredient_deltas.items() if delta}
+    if not ingredient_deltas:
+        return
+    apply_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in Cart.objects.filter(
+            purchase=recipe_id).values_list('user', flat=True)
+        for ingredient_id, delta in ingredient_deltas.items()})
+
+
+def compute_totals(user_ids=None):
+    '''Sum the shopping lists from scratch: `{(user, ingredient): total}`.'''
+    links = RecipeIngredient.objects.filter(recipe__purchases__isnull=False)
+    if user_ids is not None:
+        links = links.filter(recipe__purchases__user__in=user_ids)
+    return {
+        (row['recipe__purchases__user'], row['ingredient']): row['total']
+        for row in links.values(
+            'recipe__purchases__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by().iterator()
+        if row['total'] > 0}
+
+
+def stored_totals(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in items.values_list(
+            'user', 'ingredient', 'total_amount').iterator()}
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    '''Replace the stored shopping lists with freshly computed ones.'''
+    with transaction.atomic():
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total)
+             for (user_id, ingredient_id), total in compute_totals(
+                 user_ids).items()),
+            batch_size=batch_size)
@@ -0,0 +1,191 @@
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipe_features import shopping_list
+from recipe_features.catalog_version import INGREDIENTS, TAGS, bump_version
+from recipe_features.conditional import (RECIPES, USERS, mark_changed,
+                                         mark_changed_on_commit, user_state)
+from recipe_features.images import delete_variants, queue_variants
+from recipe_features.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                                    RecipeIngredient, Tag)
+from recipe_features.search import schedule_refresh
+from users.models import User
+
+_muted = threading.local()
+
+
+@contextmanager
+def recipe_ingredient_signals_muted():
+    '''Skip the per-row RecipeIngredient handlers inside the block.
+
+    For bulk writers that touch `updated_at` and apply the shopping list
+    deltas themselves, once for the whole batch.
+    '''
+    previous = getattr(_muted, 'recipe_ingredients', False)
+    _muted.recipe_ingredients = True
+    try:
+        yield
+    finally:
+        _muted.recipe_ingredients = previous
+
+
+def recipe_ingredient_signals_enabled():
+    return not getattr(_muted, 'recipe_ingredients', False)
+
+
+def touch_recipes(recipes):
+    '''Move `updated_at` of the given recipes (queryset or ids) to now.'''
+    if not isinstance(recipes, QuerySet):
+        recipes = Recipe.objects.filter(pk__in=recipes)
+    recipes.update(updated_at=timezone.now())
+    mark_changed_on_commit(RECIPES)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_version(INGREDIENTS)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        recipes = Recipe.objects.filter(ingredients=instance)
+        touch_recipes(recipes)
+        schedule_refresh(recipes.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_version(TAGS)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if not recipe_ingredient_signals_enabled():
+        return
+    touch_recipes([instance.recipe_id])
+    schedule_refresh([instance.recipe_id])
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_before_save(sender, instance, **kwargs):
+    if not recipe_ingredient_signals_enabled():
+        return
+    instance._previous_link = RecipeIngredient.objects.filter(
+        pk=instance.pk).values_list(
+            'recipe', 'ingredient', 'amount').first() if instance.pk else None
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    if not recipe_ingredient_signals_enabled():
+        return
+    previous = getattr(instance, '_previous_link', None)
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        shopping_list.recipe_ingredients_changed(
+            recipe_id, {ingredient_id: -amount})
+    shopping_list.recipe_ingredients_changed(
+        instance.recipe_id, {instance.ingredient_id: instance.amount})
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if not recipe_ingredient_signals_enabled():
+        return
+    shopping_list.recipe_ingredients_changed(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount})
+
+
+@receiver(post_save, sender=Cart)
+def cart_saved(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.recipe_in_cart(instance.user_id, instance.purchase_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    shopping_list.recipe_in_cart(
+        instance.user_id, instance.purchase_id, sign=-1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_recipes([instance.pk])
+    elif action == 'pre_clear':
+        touch_recipes(Recipe.objects.filter(tags=instance))
+    else:
+        touch_recipes(pk_set)
+
+
+def image_name(recipe):
+    # Read the raw value, a deferred image must not cost a query.
+    image = recipe.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_before_save(sender, instance, update_fields, **kwargs):
+    name = image_name(instance)
+    if not name or (
+            update_fields is not None and 'image' not in update_fields):
+        instance._image_changed = False
+    elif instance._state.adding:
+        instance._image_changed = True
+    else:
+        instance._image_changed = name != Recipe.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if getattr(instance, '_image_changed', False):
+        # Render the variants once the new image is committed.
+        transaction.on_commit(partial(queue_variants, [instance.pk]))
+    mark_changed_on_commit(RECIPES)
+    schedule_refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.image_variants:
+        # Kept until the deletion commits, a rollback still needs them.
+        transaction.on_commit(
+            partial(delete_variants, instance.image_variants))
+    mark_changed_on_commit(RECIPES)
+    schedule_refresh([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=Cart)
+@receiver([post_save, post_delete], sender=Follow)
+def user_state_changed(sender, instance, **kwargs):
+    mark_changed(user_state(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, **kwargs):
+    # Authors are part of every recipe payload.
+    mark_changed_on_commit(USERS)
@@ -0,0 +1,79 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from PIL import Image
+
+
+def too_large_message():
+    return (f'The image must not be larger than '
+            f'{settings.RECIPE_IMAGE_MAX_SIZE} bytes.')
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    '''Streams uploaded files to a temporary file in 64 KB chunks.
+
+    The upload is cut off as soon as it passes RECIPE_IMAGE_MAX_SIZE, so
+    neither memory nor disk hold more than the limit.
+    '''
+    chunk_size = 64 * 1024
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise serializers.ValidationError(
+                {self.field_name: [too_large_message()]})
+        return super().receive_data_chunk(raw_data, start)
+
+
+class RecipeImageField(Base64ImageField):
+    '''Image sent either as base64 JSON or as a multipart file.
+
+    Size and dimensions are checked before Pillow decodes any pixels:
+    base64 by its length, uploads while streaming (see the handler
+    above), dimensions from the image header. Uploads get the same
+    random name as base64 images, so both paths store the same state.
+    '''
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            if data.size > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(too_large_message())
+            extension = self.check_header(data)
+            data.name = f'{uuid.uuid4()}.{extension}'
+            data.seek(0)
+            return serializers.ImageField.to_internal_value(self, data)
+        if (isinstance(data, str)
+                and len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE):
+            raise serializers.ValidationError(too_large_message())
+        image = super().to_internal_value(data)
+        if image is not None:
+            self.check_header(image)
+            image.seek(0)
+        return image
+
+    def check_header(self, data):
+        '''Return the file extension after checking the image size.'''
+        data.seek(0)
+        try:
+            image = Image.open(data)
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if image.format == 'JPEG' else (
+            image.format or '').lower()
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        limit = settings.RECIPE_IMAGE_MAX_DIMENSION
+        if max(image.size) > limit:
+            raise serializers.ValidationError(
+                f'The image must not be larger than {limit}x{limit} pixels.')
+        return extension
@@ -2,7 +2,8 @@ from django.urls import path
 from django.urls.conf import include
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViesSet, TagsViewSet
+from .views import (IngredientViewSet, ProfiledRequestsView, RecipeViesSet,
+                    TagsViewSet)
 
 v1_router = DefaultRouter()
 
@@ -13,5 +14,7 @@ v1_router.register(r'recipes', RecipeViesSet, basename="recipes")
 
 
 urlpatterns = [
+    path('profiling/requests/', ProfiledRequestsView.as_view(),
+         name='profiling-requests'),
     path('', include(v1_router.urls)),
 ]
@@ -1,24 +1,69 @@
-from django.db.models.aggregates import Sum
+import tarfile
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, response, status, viewsets
+from rest_framework import (filters, parsers, permissions, response, status,
+                            viewsets)
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 
-from .pagination_hub import CustomResultsSetPagination
+from .pagination_hub import CustomResultsSetPagination, RecipeKeysetPagination
 from .serializers import (CartSerializer, FavoriteSerializer,
                           IngredientSerializer, PostRecipeSerializer,
                           RecipeSerializer, RecipeViewSerializer,
                           TagsSerializes)
-from recipe_features.download_feature.pdf_downloader import PDFDownload
-from recipe_features.download_feature.utils import format_ingredient
-from recipe_features.filters import IngredientSearchFilter, RecipeFilter
+from recipe_features.catalog_version import TAGS, get_version, shared_cache
+from recipe_features.conditional import (RECIPES, USERS, Validators,
+                                         get_changed_at)
+from recipe_features.download_feature import jobs
+from recipe_features.download_feature.exporters import (EXPORT_RENDERERS,
+                                                        ExportRenderer,
+                                                        get_exporter)
+from recipe_features.filters import (IngredientSearchFilter, RecipeFilter,
+                                     RecipeSearchFilter)
+from recipe_features.ingredient_index import ingredient_index
+from recipe_features.metrics import CONTENT_TYPE, REGISTRY, cache_lookup
 from recipe_features.models import (Cart, Favorite, Ingredient, Recipe,
-                                    RecipeIngredient, Tag)
-from recipe_features.permissions import IsAdminOrReadOnly, OwnerAdminOrReadOnly
+                                    ShoppingListItem, Tag)
+from recipe_features.permissions import (IsAdmin, IsAdminOrReadOnly,
+                                         OwnerAdminOrReadOnly)
+from recipe_features.profiling import slow_requests
+from recipe_features.recipe_import import RecipeImporter, open_images
+from recipe_features.uploads import LimitedTemporaryFileUploadHandler
+
+TAGS_CACHE_KEY = 'tags:{version}:{key}'
+SHOPPING_LIST_HEADER = 'СПИСОК ПРОДУКТОВ:'
+
 
+def tags_etag(request, *args, **kwargs):
+    if not shared_cache():
+        # A version other processes do not bump: no 304 from it.
+        return None
+    return f'{TAGS}-{get_version(TAGS)}'
 
+
+@method_decorator(condition(etag_func=tags_etag), name='list')
+@method_decorator(condition(etag_func=tags_etag), name='retrieve')
 class TagsViewSet(viewsets.ModelViewSet):
-    '''Viewset for Tag.'''
+    '''Viewset for Tag.
+
+    The catalog is read on every page load and almost never changes, so
+    list and retrieve responses are cached under the tags catalog
+    version and answer `If-None-Match` with 304 without touching the
+    database. Tag save/delete signals bump the version; with a
+    per-process cache nothing is cached, since bumps made by other
+    processes (load-csv, other workers) would not be seen.
+    '''
     queryset = Tag.objects.all()
     serializer_class = TagsSerializes
     lookup_field = 'id'
@@ -26,6 +71,30 @@ class TagsViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = None
 
+    def get_cache_key(self, key):
+        return TAGS_CACHE_KEY.format(version=get_version(TAGS), key=key)
+
+    def cached_data(self, key, build):
+        if not shared_cache():
+            return build()
+        key = self.get_cache_key(key)
+        data = cache_lookup('tags', cache.get(key))
+        if data is None:
+            data = build()
+            cache.set(key, data, settings.TAG_CACHE_TIMEOUT)
+        return data
+
+    def list(self, request, *args, **kwargs):
+        render = super().list
+        return response.Response(self.cached_data(
+            'list', lambda: list(render(request, *args, **kwargs).data)))
+
+    def retrieve(self, request, *args, **kwargs):
+        render = super().retrieve
+        return response.Response(self.cached_data(
+            f'slug:{kwargs[self.lookup_field]}',
+            lambda: dict(render(request, *args, **kwargs).data)))
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     '''Viewset for Ingredient.'''
@@ -36,15 +105,28 @@ class IngredientViewSet(viewsets.ModelViewSet):
     lookup_field = 'id'
     permission_classes = [IsAdminOrReadOnly]
     filter_backends = (IngredientSearchFilter, )
-    search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        if settings.INGREDIENT_INDEX_ENABLED and shared_cache():
+            # Rebuilt when the catalog version moves, which needs a
+            # cache every process (and load-csv) writes to.
+            ingredients = ingredient_index.search(name)
+        else:
+            ingredients = self.filter_queryset(
+                self.get_queryset())[:settings.INGREDIENT_SEARCH_LIMIT]
+        serializer = self.get_serializer(ingredients, many=True)
+        return response.Response(serializer.data)
+
 
 class RecipeViesSet(viewsets.ModelViewSet):
     '''Viewset for Recipe.'''
     queryset = Recipe.objects.all()
     filter_backends = (
-        DjangoFilterBackend, filters.SearchFilter,
+        DjangoFilterBackend, RecipeSearchFilter,
         filters.OrderingFilter)
     ordering_fields = ('-id',)
     filterset_class = RecipeFilter
@@ -52,6 +134,41 @@ class RecipeViesSet(viewsets.ModelViewSet):
 
     permission_classes = (OwnerAdminOrReadOnly,)
 
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        # Signal-kept stamps: revalidating a page costs no query.
+        validators = Validators(
+            request, get_changed_at(RECIPES), get_changed_at(USERS))
+        return validators.respond(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=kwargs[self.lookup_field]
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            updated_at = None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Validators(
+            request, updated_at, get_changed_at(USERS)).respond(
+            request, super().retrieve, *args, **kwargs)
+
+    @property
+    def paginator(self):
+        '''Switch to keyset pagination when the client sends `cursor`.'''
+        if not hasattr(self, '_paginator'):
+            cursor_param = RecipeKeysetPagination.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = RecipeKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
@@ -60,7 +177,7 @@ class RecipeViesSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         recipe = self.perform_create(serializer)
         return response.Response(RecipeSerializer(
-            recipe, context={'request': request}).data,
+            self.reload(recipe), context={'request': request}).data,
             status=status.HTTP_201_CREATED)
 
     def perform_update(self, serializer):
@@ -73,9 +190,37 @@ class RecipeViesSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         recipe = self.perform_update(serializer)
         return response.Response(RecipeSerializer(
-            recipe, context={'request': request}).data,
+            self.reload(recipe), context={'request': request}).data,
             status=status.HTTP_200_OK)
 
+    def reload(self, recipe):
+        '''Fetch a written recipe the way list/retrieve serialize it.'''
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user).get(pk=recipe.pk)
+
+    def initialize_request(self, request, *args, **kwargs):
+        if self.action_map.get(request.method.lower()) in (
+                'create', 'update', 'partial_update'):
+            # Multipart images go to a temp file in chunks, up to a limit.
+            request.upload_handlers = [
+                LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if isinstance(
+                getattr(request, 'accepted_renderer', None), ExportRenderer):
+            # Exporters build their own responses, anything DRF renders
+            # here (errors, job status) is plain JSON.
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_variant'] = 'card'
+        return context
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeSerializer
@@ -124,7 +269,8 @@ class RecipeViesSet(viewsets.ModelViewSet):
         serializer = CartSerializer(
             data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return response.Response(RecipeViewSerializer(
             purchase).data,
             status=status.HTTP_201_CREATED)
@@ -138,17 +284,123 @@ class RecipeViesSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['GET'],
+        methods=['POST'],
+        url_path='import',
+        permission_classes=[IsAdmin],
+        parser_classes=[parsers.MultiPartParser],
+    )
+    def import_recipes(self, request):
+        '''Bulk import: `recipes` NDJSON file plus `images` zip/tar archive.
+
+        Invalid rows are skipped and listed in `errors` with their line.
+        '''
+        recipes = request.FILES.get('recipes')
+        archive = request.FILES.get('images')
+        if recipes is None or archive is None:
+            return response.Response(
+                {'detail': 'Both `recipes` and `images` files are required.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            images = open_images(archive)
+        except (tarfile.TarError, zipfile.BadZipFile):
+            return response.Response(
+                {'detail': '`images` must be a zip or tar archive.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            importer = RecipeImporter(
+                images, default_author=request.user).run(recipes)
+        finally:
+            images.close()
+        return response.Response({
+            'created': importer.created,
+            'errors': [
+                {'line': line, 'error': message}
+                for line, message in importer.errors]})
+
+    @action(
+        detail=False,
+        methods=['GET', 'POST'],
         url_path='download_shopping_cart',
         permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=EXPORT_RENDERERS,
     )
     def show_cart(self, request):
-        list_of_ingredients = RecipeIngredient.objects.filter(
-            recipe__purchases__user=self.request.user
+        '''Shopping list in the format asked by `?format=` or `Accept`.
+
+        GET renders it inline, POST starts a background export job and
+        answers 202 with the job to poll.
+        '''
+        list_of_ingredients = ShoppingListItem.objects.filter(
+            user=self.request.user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit').annotate(
-                amount=Sum('amount'))
-        list_of_recipes = [format_ingredient(s) for s in list_of_ingredients]
-        result = PDFDownload()
-        return result.download(list_of_recipes, 'СПИСОК ПРОДУКТОВ:')
+            'ingredient__measurement_unit',
+            amount=F('total_amount')).order_by('ingredient__name')
+        exporter = get_exporter(request.accepted_renderer.format)
+        if request.method == 'POST':
+            job = jobs.start_job(
+                request.user, exporter, list_of_ingredients.iterator(),
+                SHOPPING_LIST_HEADER)
+            return self.export_job_response(request, job)
+        if exporter.cache_results:
+            return jobs.cached_download(
+                exporter, list_of_ingredients.iterator(),
+                SHOPPING_LIST_HEADER)
+        return exporter.download(
+            list_of_ingredients.iterator(), SHOPPING_LIST_HEADER)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{32})',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def export_job(self, request, job_id):
+        '''Status of an export job, or its file once it is done.'''
+        job = jobs.get_job(job_id)
+        if job is None or job['user'] != request.user.pk:
+            raise Http404
+        if job['status'] == jobs.DONE:
+            if not jobs.result_storage().exists(job['result']):
+                # Deleted by clean-exports.
+                raise Http404
+            return jobs.serve_result(
+                get_exporter(job['format']), job['result'])
+        return self.export_job_response(request, job)
+
+    def export_job_response(self, request, job):
+        url = request.build_absolute_uri(reverse(
+            'recipes-export-job', kwargs={'job_id': job['id']}))
+        code = status.HTTP_202_ACCEPTED
+        if job['status'] == jobs.FAILED:
+            code = status.HTTP_200_OK
+        return response.Response(
+            {'id': job['id'], 'status': job['status'], 'url': url},
+            status=code, headers={'Location': url})
+
+
+class ProfiledRequestsView(APIView):
+    '''Slowest profiled requests of the process answering, for admins.
+
+    DELETE empties the buffer. With several server processes each one
+    has its own buffer.
+    '''
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return response.Response({
+            'enabled': settings.PROFILING_ENABLED,
+            'slow_request_ms': settings.PROFILING_SLOW_REQUEST_MS,
+            'requests': slow_requests.slowest()})
+
+    def delete(self, request):
+        slow_requests.clear()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics(request):
+    '''Prometheus scrape target, see recipe_features.metrics.'''
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        REGISTRY.exposition(), content_type=CONTENT_TYPE)
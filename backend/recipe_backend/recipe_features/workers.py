@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor():
+    '''Thread pool shared by the background jobs of this process.'''
+    with _executors_lock:
+        if 'default' not in _executors:
+            _executors['default'] = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='recipe-worker')
+        return _executors['default']
+
+
+def run_in_thread(fn, *args, **kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Pool threads outlive requests, so nothing else would close them.
+        connections.close_all()
+
+
+def submit(fn, *args, **kwargs):
+    '''Run `fn` on the worker pool and return its Future.
+
+    With `BACKGROUND_WORKERS = 0` the call runs inline, which is what
+    tests and single-threaded management commands want.
+    '''
+    if not settings.BACKGROUND_WORKERS:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+    return get_executor().submit(run_in_thread, fn, *args, **kwargs)
@@ -0,0 +1,48 @@
+'''Benchmarks on a seeded database, skipped unless RUN_BENCHMARKS is set.
+
+    RUN_BENCHMARKS=1 python manage.py test tests.benchmarks
+
+The scale of the seeded catalog is set with BENCHMARK_RECIPES (100000
+by default), BENCHMARK_USERS (1000), and the per-user BENCHMARK_FAVORITES
+(50), BENCHMARK_CARTS (10) and BENCHMARK_FOLLOWS (10).
+'''
+import os
+import statistics
+import sys
+import time
+from unittest import skipUnless
+
+BENCHMARK_RECIPES = int(os.environ.get('BENCHMARK_RECIPES', 100000))
+SCALE = {
+    'recipes': BENCHMARK_RECIPES,
+    'users': int(os.environ.get('BENCHMARK_USERS', 1000)),
+    'favorites_per_user': int(os.environ.get('BENCHMARK_FAVORITES', 50)),
+    'carts_per_user': int(os.environ.get('BENCHMARK_CARTS', 10)),
+    'follows_per_user': int(os.environ.get('BENCHMARK_FOLLOWS', 10)),
+}
+
+benchmark = skipUnless(
+    os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1 to run')
+
+
+def timings(function, repeat=5):
+    '''Wall times of `function()` in milliseconds, after a warm-up.'''
+    function()
+    result = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def timed(function, repeat=5):
+    '''Median wall time of `function()` in milliseconds.'''
+    return statistics.median(timings(function, repeat))
+
+
+def report(title, rows):
+    '''Print `[(label, milliseconds)]` under a title.'''
+    sys.stdout.write(f'\n{title}\n')
+    for label, milliseconds in rows:
+        sys.stdout.write(f'  {label:<40} {milliseconds:9.2f} ms\n')
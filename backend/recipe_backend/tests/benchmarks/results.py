@@ -0,0 +1,103 @@
+'''JSON report of the endpoint benchmark and its comparison to a baseline.
+
+    python -m tests.benchmarks.results baseline.json report.json
+
+exits with status 1 when the report regressed against the baseline.
+'''
+import json
+import platform
+import statistics
+import sys
+
+from django.db import connection
+from django.utils import timezone
+
+# A slower median than this fraction over the baseline is a regression.
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def endpoint_result(url, user, queries, budget, timings):
+    return {
+        'url': url,
+        'user': user,
+        'queries': queries,
+        'query_budget': budget,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def build_report(scale, endpoints):
+    return {
+        'created': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'scale': scale,
+        'endpoints': endpoints,
+    }
+
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def read_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''Regressions of `report` against `baseline`, as readable lines.
+
+    An endpoint regresses when it runs more queries than in the baseline
+    or its median time grows by more than `tolerance`. Endpoints missing
+    from either side are not compared. Timings are only comparable on
+    the same database and scale.
+    '''
+    problems = []
+    if (report['database'], report['scale']) != (
+            baseline['database'], baseline['scale']):
+        problems.append(
+            f"baseline was taken on {baseline['database']} at "
+            f"{baseline['scale']}, the report on {report['database']} at "
+            f"{report['scale']}")
+        return problems
+    for name, result in sorted(report['endpoints'].items()):
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            problems.append(
+                f"{name}: {result['queries']} queries, "
+                f"baseline {before['queries']}")
+        limit = before['p50_ms'] * (1 + tolerance)
+        if result['p50_ms'] > limit:
+            problems.append(
+                f"{name}: median {result['p50_ms']:.2f} ms, baseline "
+                f"{before['p50_ms']:.2f} ms (+{tolerance:.0%} allowed)")
+    return problems
+
+
+def main(argv):
+    if len(argv) not in (3, 4):
+        sys.stderr.write(
+            'usage: python -m tests.benchmarks.results '
+            'BASELINE REPORT [TOLERANCE]\n')
+        return 2
+    tolerance = float(argv[3]) if len(argv) == 4 else DEFAULT_TOLERANCE
+    problems = compare(read_report(argv[2]), read_report(argv[1]), tolerance)
+    for problem in problems:
+        sys.stdout.write(f'{problem}\n')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
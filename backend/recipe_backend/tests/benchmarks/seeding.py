@@ -0,0 +1,94 @@
+import random
+from datetime import timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+from django.utils import timezone
+
+from recipe_features import search, shopping_list
+from recipe_features.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                                    RecipeIngredient, Tag)
+from users.models import User
+
+BATCH_SIZE = 5000
+
+
+def in_batches(objects, batch_size=BATCH_SIZE):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_create(model, objects):
+    for batch in in_batches(objects):
+        model.objects.bulk_create(batch)
+
+
+def seed(recipes, users=100, tags=8, ingredients=500, tags_per_recipe=2,
+         ingredients_per_recipe=5, favorites_per_user=50, carts_per_user=5,
+         follows_per_user=5, random_seed=0):
+    '''Fill the database with a reproducible recipe catalog.
+
+    Rows are bulk inserted without signals; the shopping lists and the
+    search index are rebuilt once at the end.
+    '''
+    rng = random.Random(random_seed)
+    bulk_create(User, (
+        User(username=f'bench-{i}', email=f'bench-{i}@mail.com')
+        for i in range(users)))
+    user_ids = list(User.objects.filter(
+        username__startswith='bench-').values_list('id', flat=True))
+    bulk_create(Tag, (
+        Tag(name=f'bench-tag-{i}', slug=f'bench-tag-{i}', color='#000000')
+        for i in range(tags)))
+    tag_ids = dict(Tag.objects.filter(
+        slug__startswith='bench-tag-').values_list('slug', 'id'))
+    bulk_create(Ingredient, (
+        Ingredient(name=f'bench ingredient {i}', measurement_unit='g')
+        for i in range(ingredients)))
+    ingredient_ids = list(Ingredient.objects.filter(
+        name__startswith='bench ingredient ').values_list('id', flat=True))
+
+    published = timezone.now() - timedelta(seconds=recipes)
+    bulk_create(Recipe, (
+        Recipe(
+            author_id=rng.choice(user_ids), name=f'Bench recipe {i}',
+            text=f'Step {i}', cooking_time=rng.randint(1, 120),
+            image='recipes/bench.jpg',
+            pud_date=published + timedelta(seconds=i))
+        for i in range(recipes)))
+    recipe_ids = list(Recipe.objects.filter(
+        name__startswith='Bench recipe ').values_list('id', flat=True))
+
+    bulk_create(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(list(tag_ids.values()), tags_per_recipe)))
+    bulk_create(RecipeIngredient, (
+        RecipeIngredient(
+            recipe_id=recipe_id, ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, ingredients_per_recipe)))
+    bulk_create(Favorite, (
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rng.sample(recipe_ids, favorites_per_user)))
+    bulk_create(Cart, (
+        Cart(user_id=user_id, purchase_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rng.sample(recipe_ids, carts_per_user)))
+    bulk_create(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rng.sample(user_ids, follows_per_user)
+        if author_id != user_id))
+    shopping_list.rebuild(user_ids)
+    search.refresh()
+    return SimpleNamespace(
+        users=user_ids, tags=tag_ids, ingredients=ingredient_ids,
+        recipes=recipe_ids)
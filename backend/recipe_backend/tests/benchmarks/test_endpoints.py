@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from tests.benchmarks import SCALE, benchmark, report, timings
+from tests.benchmarks.results import (build_report, compare, endpoint_result,
+                                      read_report, write_report)
+from tests.benchmarks.seeding import seed
+from users.models import User
+
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 10))
+REPORT_PATH = os.environ.get('BENCHMARK_REPORT', 'benchmark-report.json')
+BASELINE_PATH = os.environ.get('BENCHMARK_BASELINE')
+TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', 0.25))
+
+# name: (url, user, SQL query budget). `reader` has favorites, a cart
+# and subscriptions; the budgets do not depend on the scale.
+ENDPOINTS = {
+    'tags-list': ('/api/tags/', 'anonymous', 0),
+    'tags-detail': ('/api/tags/{tag}/', 'anonymous', 0),
+    'ingredients-list': ('/api/ingredients/', 'anonymous', 1),
+    'ingredients-search': (
+        '/api/ingredients/?name=bench ingredient 4', 'anonymous', 0),
+    'recipes-list': ('/api/recipes/', 'anonymous', 4),
+    'recipes-list-reader': ('/api/recipes/', 'reader', 4),
+    'recipes-cursor': ('/api/recipes/?cursor=', 'reader', 3),
+    'recipes-author': ('/api/recipes/?author={author}', 'reader', 5),
+    'recipes-tags': ('/api/recipes/?tags={tag}&tags={tag2}', 'reader', 4),
+    'recipes-favorited': ('/api/recipes/?is_favorited=1', 'reader', 4),
+    'recipes-not-favorited': ('/api/recipes/?is_favorited=0', 'reader', 4),
+    'recipes-in-cart': ('/api/recipes/?is_in_shopping_cart=1', 'reader', 4),
+    'recipes-search': ('/api/recipes/?search={number}', 'reader', 5),
+    'recipes-detail': ('/api/recipes/{recipe}/', 'anonymous', 4),
+    'recipes-detail-reader': ('/api/recipes/{recipe}/', 'reader', 4),
+    'users-list': ('/api/users/', 'reader', 8),
+    'users-detail': ('/api/users/{author}/', 'reader', 2),
+    'subscriptions': (
+        '/api/users/subscriptions/?recipes_limit=3', 'reader', 3),
+    'download-shopping-cart-txt': (
+        '/api/recipes/download_shopping_cart/?format=txt', 'reader', 1),
+    'download-shopping-cart-pdf': (
+        '/api/recipes/download_shopping_cart/?format=pdf', 'reader', 1),
+}
+
+
+@benchmark
+class EndpointBenchmark(TestCase):
+    '''
+    Time every public endpoint on the seeded catalog and hold it to its
+    query budget.
+
+    The results go to BENCHMARK_REPORT (benchmark-report.json) and, with
+    BENCHMARK_BASELINE set, are compared to an earlier report: more
+    queries or a median slower by BENCHMARK_TOLERANCE (0.25) fail.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(**SCALE)
+        cls.reader = User.objects.get(pk=cls.data.users[0])
+        recipe = cls.data.recipes[len(cls.data.recipes) // 2]
+        tags = sorted(cls.data.tags)
+        cls.params = {
+            'tag': tags[0], 'tag2': tags[1], 'recipe': recipe,
+            'author': cls.reader.following.values_list(
+                'author', flat=True).first() or cls.reader.pk,
+            'number': len(cls.data.recipes) // 3,
+        }
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root, BACKGROUND_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def client_for(self, user):
+        client = APIClient()
+        if user == 'reader':
+            client.force_authenticate(self.reader)
+        return client
+
+    def measure(self, name, url, user, budget):
+        url = url.format(**self.params)
+        client = self.client_for(user)
+
+        def get():
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, f'{name}: {url}')
+            if response.streaming:
+                # Streamed downloads query while the body is read.
+                b''.join(response.streaming_content)
+
+        # The first request fills caches (tags, ingredient index, PDF).
+        get()
+        with CaptureQueriesContext(connection) as context:
+            get()
+        return endpoint_result(
+            url, user, len(context.captured_queries), budget,
+            timings(get, REPEAT))
+
+    def test_endpoints(self):
+        results = {
+            name: self.measure(name, *endpoint)
+            for name, endpoint in ENDPOINTS.items()}
+        report(f'Endpoints at {SCALE}, median of {REPEAT}', [
+            (f"{name} ({result['queries']}q)", result['p50_ms'])
+            for name, result in results.items()])
+        current = build_report(SCALE, results)
+        write_report(current, REPORT_PATH)
+        for name, result in results.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(
+                    result['queries'], result['query_budget'], result['url'])
+        if BASELINE_PATH:
+            problems = compare(current, read_report(BASELINE_PATH), TOLERANCE)
+            self.assertEqual(problems, [], '\n'.join(problems))
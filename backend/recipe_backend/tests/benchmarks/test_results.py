@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from tests.benchmarks.results import compare
+
+SCALE = {'recipes': 100}
+
+
+def report(queries, p50_ms):
+    return {
+        'database': 'sqlite', 'scale': SCALE,
+        'endpoints': {'recipes-list': {'queries': queries, 'p50_ms': p50_ms}}}
+
+
+class CompareTest(SimpleTestCase):
+    '''Runs with the regular tests, it needs no seeded database.'''
+
+    def test_within_tolerance(self):
+        self.assertEqual(compare(report(5, 12), report(5, 10)), [])
+
+    def test_regressions(self):
+        self.assertEqual(compare(report(6, 13), report(5, 10)), [
+            'recipes-list: 6 queries, baseline 5',
+            'recipes-list: median 13.00 ms, baseline 10.00 ms '
+            '(+25% allowed)'])
+
+    def test_different_scale_is_not_compared(self):
+        baseline = dict(report(5, 10), scale={'recipes': 1000})
+        self.assertEqual(len(compare(report(5, 10), baseline)), 1)
@@ -0,0 +1,65 @@
+from functools import reduce
+from operator import or_
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from django.http import QueryDict
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipe_features.filters import RecipeFilter, tag_ids
+from recipe_features.models import Recipe
+from tests.benchmarks import BENCHMARK_RECIPES, SCALE, benchmark, report, timed
+from tests.benchmarks.seeding import seed
+
+
+@benchmark
+class TagFilterBenchmark(TestCase):
+    '''The cached slug map and IN subquery against the former
+    AllValuesMultipleFilter: a DISTINCT over the recipe tags for the
+    choices and a join that repeats recipes having several of the tags.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(**SCALE)
+        cls.slugs = sorted(cls.data.tags)[:2]
+
+    def join_filter(self):
+        list(Recipe.objects.distinct().order_by('tags__slug').values_list(
+            'tags__slug', flat=True))
+        return Recipe.objects.filter(reduce(or_, (
+            Q(tags__slug=slug) for slug in self.slugs)))
+
+    def subquery_filter(self):
+        return RecipeFilter(
+            QueryDict(urlencode({'tags': self.slugs}, doseq=True)),
+            queryset=Recipe.objects.all()).qs
+
+    def request(self):
+        return APIClient().get('/api/recipes/', {'tags': self.slugs})
+
+    def test_tag_filter(self):
+        joined = self.join_filter()
+        matching = Recipe.objects.filter(
+            tags__slug__in=self.slugs).values('pk').distinct().count()
+        self.assertGreater(joined.count(), matching)
+        self.assertEqual(self.subquery_filter().count(), matching)
+        self.assertEqual(self.request().data['count'], matching)
+
+        def page(filter_queryset):
+            def count_and_page():
+                queryset = filter_queryset()
+                queryset.count()
+                list(queryset[:6])
+            return count_and_page
+
+        report(f'Tag filter, {BENCHMARK_RECIPES} recipes, 2 tags', [
+            ('choices: SELECT DISTINCT tags__slug', timed(
+                lambda: list(Recipe.objects.distinct().order_by(
+                    'tags__slug').values_list('tags__slug', flat=True)))),
+            ('choices: cached slug map', timed(tag_ids)),
+            ('join: choices + count + page', timed(page(self.join_filter))),
+            ('subquery: count + page', timed(page(self.subquery_filter))),
+            ('subquery: GET /api/recipes/', timed(self.request)),
+        ])
@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe_features.models import (Favorite, Ingredient, Recipe,
+                                    RecipeIngredient, Tag)
+from users.models import User
+
+
+class RecipeConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.reader = User.objects.create(
+            username='reader', email='reader@mail.com')
+        cls.tag = Tag.objects.create(
+            name='Lunch', slug='lunch', color='#9d2610')
+        cls.ingredient = Ingredient.objects.create(
+            name='Flour', measurement_unit='g')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Pie', text='text', cooking_time=10,
+            image='recipes/test.png')
+        cls.recipe.tags.add(cls.tag)
+        cls.link = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=100)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.urls = ('/api/recipes/', f'/api/recipes/{self.recipe.id}/')
+
+    def revalidate(self, url, response):
+        return self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code
+
+    def assert_changes_invalidate(self, change):
+        responses = {url: self.client.get(url) for url in self.urls}
+        for url, response in responses.items():
+            self.assertEqual(self.revalidate(url, response), 304)
+        change()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_not_modified_skips_serialization(self):
+        response = self.client.get(self.urls[1])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(self.urls[1], response), 304)
+
+    def test_list_revalidation_costs_no_query(self):
+        response = self.client.get(self.urls[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(self.urls[0], response), 304)
+
+    def test_cursor_page_runs_no_aggregate(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/recipes/?cursor=')
+        for query in context.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('MAX(', query['sql'])
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.urls[1])
+        not_modified = self.client.get(
+            self.urls[1], HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_answers_without_validators(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_recipe_change(self):
+        def change():
+            self.recipe.name = 'Cake'
+            self.recipe.save()
+        self.assert_changes_invalidate(change)
+
+    def test_ingredient_link_change(self):
+        def change():
+            self.link.amount = 200
+            self.link.save()
+        self.assert_changes_invalidate(change)
+
+    def test_tag_change(self):
+        def change():
+            self.tag.name = 'Dinner'
+            self.tag.save()
+        self.assert_changes_invalidate(change)
+
+    def test_tags_set_change(self):
+        self.assert_changes_invalidate(lambda: self.recipe.tags.clear())
+
+    def test_author_change(self):
+        def change():
+            self.author.username = 'chef'
+            self.author.save()
+        self.assert_changes_invalidate(change)
+
+    def test_favorite_change(self):
+        self.assert_changes_invalidate(
+            lambda: Favorite.objects.create(
+                user=self.reader, recipe=self.recipe))
+
+    def test_recipe_deleted_from_list(self):
+        response = self.client.get(self.urls[0])
+        Recipe.objects.create(
+            author=self.author, name='Soup', text='text', cooking_time=10,
+            image='recipes/test.png').delete()
+        self.assertEqual(self.revalidate(self.urls[0], response), 200)
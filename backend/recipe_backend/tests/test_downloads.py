@@ -0,0 +1,77 @@
+import csv
+import json
+from io import StringIO
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from recipe_features.download_feature import pdf_downloader
+from recipe_features.download_feature.csv_downloader import CSVDownload
+from recipe_features.download_feature.json_downloader import JSONDownload
+from recipe_features.download_feature.pdf_downloader import PDFDownload
+from recipe_features.download_feature.txt_downloader import TXTDownload
+
+HEADER = 'СПИСОК ПРОДУКТОВ:'
+
+
+def ingredients(count):
+    return [
+        {'ingredient__name': f'Ingredient "{i}", sifted',
+         'ingredient__measurement_unit': 'г', 'amount': i}
+        for i in range(count)]
+
+
+def content(response):
+    return b''.join(response.streaming_content)
+
+
+class PDFDownloadTest(SimpleTestCase):
+    def test_long_list_spans_pages(self):
+        response = PDFDownload().download(ingredients(200), HEADER)
+        data = content(response)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(int(response['Content-Length']), len(data))
+        self.assertGreater(data.count(b'/Type /Page\n'), 1)
+
+    def test_font_is_registered_once(self):
+        PDFDownload().download(ingredients(1), HEADER)
+        with mock.patch.object(pdf_downloader, 'TTFont') as font:
+            content(PDFDownload().download(ingredients(1), HEADER))
+            content(PDFDownload().download(ingredients(2), HEADER))
+        font.assert_not_called()
+
+    def test_iter_chunks_matches_download(self):
+        chunks = b''.join(PDFDownload().iter_chunks(ingredients(3), HEADER))
+        self.assertTrue(chunks.startswith(b'%PDF'))
+
+
+class TextDownloadsTest(SimpleTestCase):
+    def test_txt(self):
+        text = content(
+            TXTDownload().download(ingredients(2), HEADER)).decode()
+        self.assertEqual(text, (
+            f'{HEADER}\n\n'
+            '* Ingredient "0", sifted (г) - 0\n'
+            '* Ingredient "1", sifted (г) - 1\n'))
+
+    def test_csv(self):
+        text = content(
+            CSVDownload().download(ingredients(2), HEADER)).decode()
+        self.assertEqual(list(csv.reader(StringIO(text))), [
+            ['name', 'measurement_unit', 'amount'],
+            ['Ingredient "0", sifted', 'г', '0'],
+            ['Ingredient "1", sifted', 'г', '1']])
+
+    def test_json(self):
+        for count in (0, 1, 3):
+            with self.subTest(count=count):
+                data = json.loads(content(
+                    JSONDownload().download(ingredients(count), HEADER)))
+                self.assertEqual(data['title'], HEADER)
+                self.assertEqual(len(data['ingredients']), count)
+
+    def test_large_list_is_streamed_in_chunks(self):
+        response = TXTDownload().download(
+            (row for row in ingredients(20000)), HEADER)
+        self.assertTrue(response.streaming)
+        self.assertGreater(len(list(response.streaming_content)), 1)
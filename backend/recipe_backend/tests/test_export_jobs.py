@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe_features.download_feature.pdf_downloader import PDFDownload
+from recipe_features.download_feature.txt_downloader import TXTDownload
+from recipe_features.models import Cart, Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ExportJobsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.buyer = User.objects.create(
+            username='buyer', email='buyer@mail.com')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=name, text='text', cooking_time=10,
+                image='recipes/test.png')
+            for name in ('Pie', 'Cake')]
+        for recipe, amount in zip(cls.recipes, (100, 200)):
+            RecipeIngredient.objects.create(
+                recipe=recipe, amount=amount,
+                ingredient=Ingredient.objects.create(
+                    name=f'Flour {amount}', measurement_unit='g'))
+        Cart.objects.create(user=cls.buyer, purchase=cls.recipes[0])
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.exports = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.exports)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root, EXPORT_RESULTS_ROOT=self.exports,
+            BACKGROUND_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def start(self, export_format='pdf', status_code=202):
+        response = self.client.post(f'{URL}?format={export_format}')
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Location'], response.data['url'])
+        return response.data
+
+    def test_job_result_is_downloaded(self):
+        job = self.start()
+        self.assertEqual(job['status'], 'done')
+        response = self.client.get(job['url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(
+            b'%PDF'))
+
+    def test_unchanged_cart_is_not_rendered_again(self):
+        self.start()
+        with mock.patch.object(PDFDownload, 'render') as render:
+            self.assertEqual(self.start()['status'], 'done')
+            self.assertEqual(self.client.get(URL).status_code, 200)
+        render.assert_not_called()
+        self.assertEqual(len(os.listdir(self.exports)), 1)
+
+    def test_changed_cart_is_rendered(self):
+        self.start()
+        Cart.objects.create(user=self.buyer, purchase=self.recipes[1])
+        self.start()
+        self.assertEqual(len(os.listdir(self.exports)), 2)
+
+    def test_plain_download_fills_the_cache(self):
+        self.client.get(URL)
+        self.client.get(f'{URL}?format=txt')
+        self.assertEqual(
+            [name.rsplit('.')[-1] for name in os.listdir(self.exports)],
+            ['pdf'])
+
+    def test_pending_job(self):
+        with mock.patch('recipe_features.download_feature.jobs.submit'):
+            job = self.start('txt')
+        self.assertEqual(job['status'], 'pending')
+        response = self.client.get(job['url'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_failed_job(self):
+        with mock.patch.object(TXTDownload, 'write', side_effect=OSError):
+            job = self.start('txt', status_code=200)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(self.client.get(job['url']).data['status'], 'failed')
+
+    def test_jobs_are_private(self):
+        job = self.start()
+        other = User.objects.create(username='other', email='other@mail.com')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(job['url']).status_code, 404)
+        self.assertEqual(
+            self.client.get(f'{URL}{"0" * 32}/').status_code, 404)
+
+    def test_results_are_not_public_media(self):
+        self.start()
+        self.assertEqual(os.listdir(self.media_root), [])
+        self.assertEqual(len(os.listdir(self.exports)), 1)
+
+    def expire(self):
+        for name in os.listdir(self.exports):
+            path = os.path.join(self.exports, name)
+            old = os.path.getmtime(path) - settings.EXPORT_RESULTS_TTL - 1
+            os.utime(path, (old, old))
+
+    def test_expired_result_is_rendered_again(self):
+        self.start()
+        self.expire()
+        with mock.patch.object(
+                PDFDownload, 'render', wraps=PDFDownload().render) as render:
+            self.assertEqual(self.client.get(URL).status_code, 200)
+        render.assert_called_once()
+        self.assertEqual(len(os.listdir(self.exports)), 1)
+
+    def test_clean_exports_dry_run(self):
+        self.start()
+        self.expire()
+        call_command('clean-exports', '--dry-run', stdout=StringIO())
+        self.assertEqual(len(os.listdir(self.exports)), 1)
+
+    def test_clean_exports(self):
+        job = self.start()
+        self.start('txt')
+        self.expire()
+        Cart.objects.create(user=self.buyer, purchase=self.recipes[1])
+        fresh = self.start()
+        output = StringIO()
+        call_command('clean-exports', stdout=output)
+        self.assertIn('2 exports deleted', output.getvalue())
+        self.assertEqual(len(os.listdir(self.exports)), 1)
+        self.assertEqual(self.client.get(job['url']).status_code, 404)
+        self.assertEqual(self.client.get(fresh['url']).status_code, 200)
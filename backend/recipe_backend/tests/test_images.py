@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from PIL import Image
+from recipe_features.images import generate_variants, render_variants
+from recipe_features.models import Recipe
+from users.models import User
+
+
+def photo(size=(2000, 1000)):
+    '''JPEG with EXIF metadata, as phones upload them.'''
+    image = Image.new('RGB', size, 'green')
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'
+    data = BytesIO()
+    image.save(data, 'JPEG', exif=exif)
+    return data.getvalue()
+
+
+class ImagePipelineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root, BACKGROUND_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.original = default_storage.save(
+            'recipes/pie.jpg', ContentFile(photo()))
+
+    def open(self, name):
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(BytesIO(f.read()))
+            image.load()
+        return image
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=self.author, name='Pie', text='text',
+                cooking_time=10, image=self.original)
+
+    def test_variants(self):
+        variants = render_variants(self.original)
+        for variant, size in (
+                ('thumb', (160, 160)), ('card', (600, 400)),
+                ('full', (1600, 800))):
+            for image_format, pil_format in (
+                    ('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with self.subTest(variant=variant, format=image_format):
+                    image = self.open(variants[variant][image_format])
+                    self.assertEqual(image.format, pil_format)
+                    self.assertEqual(image.size, size)
+                    self.assertNotIn('exif', image.info)
+
+    def test_small_images_are_not_upscaled(self):
+        name = default_storage.save(
+            'recipes/tiny.jpg', ContentFile(photo((300, 300))))
+        variants = render_variants(name)
+        self.assertEqual(self.open(variants['card']['jpeg']).size, (300, 200))
+        self.assertEqual(self.open(variants['full']['jpeg']).size, (300, 300))
+
+    def test_saved_recipe_gets_variants(self):
+        recipe = self.create_recipe()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            set(recipe.image_variants), {'thumb', 'card', 'full'})
+        client = APIClient()
+        card = client.get('/api/recipes/').data['results'][0]
+        self.assertTrue(card['image'].endswith('/variants/pie/card.jpg'))
+        self.assertTrue(card['images']['thumb']['webp'].endswith(
+            '/variants/pie/thumb.webp'))
+        detail = client.get(f'/api/recipes/{recipe.id}/').data
+        self.assertTrue(detail['image'].endswith('/variants/pie/full.jpg'))
+
+    def test_original_is_served_until_variants_exist(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Pie', text='text', cooking_time=10,
+            image=self.original)
+        data = APIClient().get(f'/api/recipes/{recipe.id}/').data
+        self.assertTrue(data['image'].endswith('/recipes/pie.jpg'))
+        self.assertEqual(data['images'], {})
+
+    def test_regenerate_command(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Pie', text='text', cooking_time=10,
+            image=self.original)
+        out = StringIO()
+        call_command(
+            'regenerate-images', '--missing', '--workers', '0', stdout=out)
+        self.assertIn('Rendered variants of 1 recipes, 0 failed.',
+                      out.getvalue())
+        recipe.refresh_from_db()
+        self.assertIn('card', recipe.image_variants)
+
+    def test_image_change_is_detected_on_save(self):
+        recipe = self.create_recipe()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with mock.patch('recipe_features.signals.queue_variants') as queue:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.name = 'Apple pie'
+                recipe.save()
+            queue.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.image = default_storage.save(
+                    'recipes/cake.jpg', ContentFile(photo()))
+                recipe.save()
+            queue.assert_called_once_with([recipe.pk])
+
+    def test_loading_recipes_costs_nothing(self):
+        self.create_recipe()
+        with mock.patch(
+                'recipe_features.signals.image_name') as image_name:
+            list(Recipe.objects.all())
+        image_name.assert_not_called()
+
+    def test_variants_are_deleted_with_the_recipe(self):
+        recipe = self.create_recipe()
+        recipe.refresh_from_db()
+        card = recipe.image_variants['card']['jpeg']
+        self.assertTrue(default_storage.exists(card))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            recipe.delete()
+        # Still there if the deletion is rolled back.
+        self.assertTrue(default_storage.exists(card))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(default_storage.exists(card))
+
+    def test_rendered_variants_change_the_list_validators(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Pie', text='text', cooking_time=10,
+            image=self.original)
+        client = APIClient()
+        before = client.get('/api/recipes/')
+        generate_variants(recipe.pk)
+        response = client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['image'].endswith(
+            '/variants/pie/card.jpg'))
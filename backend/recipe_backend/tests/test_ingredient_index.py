@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe_features.catalog_version import INGREDIENTS, VERSION_KEY
+from recipe_features.checks import shared_cache_check
+from recipe_features.ingredient_index import (IngredientPrefixIndex,
+                                              ingredient_index)
+from recipe_features.models import Ingredient
+
+
+class IngredientPrefixIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('сахарная пудра', 'сахар', 'ванильный сахар',
+                     'соль', 'Сахар тростниковый'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def names(self, term, **kwargs):
+        return [
+            ingredient.name
+            for ingredient in ingredient_index.search(term, **kwargs)]
+
+    def test_ranking(self):
+        self.assertEqual(
+            self.names('Сахар'),
+            ['сахар', 'Сахар тростниковый', 'сахарная пудра',
+             'ванильный сахар'])
+
+    def test_limit(self):
+        self.assertEqual(self.names('сах', limit=2),
+                         ['сахар', 'Сахар тростниковый'])
+
+    def test_lookup_does_not_query_database(self):
+        ingredient_index.search('соль')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('со'), ['соль'])
+
+    def test_rebuilt_after_change(self):
+        self.assertEqual(self.names('перец'), [])
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertEqual(self.names('перец'), ['перец'])
+        Ingredient.objects.filter(name='перец').get().delete()
+        self.assertEqual(self.names('перец'), [])
+
+    def test_built_when_version_is_none(self):
+        index = IngredientPrefixIndex()
+        with mock.patch(
+                'recipe_features.ingredient_index.get_version',
+                return_value=None):
+            self.assertEqual(
+                [ingredient.name for ingredient in index.search('соль')],
+                ['соль'])
+
+    def test_version_bumped_by_another_process(self):
+        self.assertEqual(self.names('перец'), [])
+        # load-csv in its own process: no signal here, only the shared
+        # cache tells this one about the new rows.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='перец', measurement_unit='г')])
+        other_process = FileBasedCache(
+            settings.CACHES['default']['LOCATION'], {})
+        other_process.incr(VERSION_KEY.format(name=INGREDIENTS))
+        self.assertEqual(self.names('перец'), ['перец'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_endpoint_with_process_local_cache(self):
+        self.client.get('/api/ingredients/?name=соль')
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='солод', measurement_unit='г')])
+        response = self.client.get('/api/ingredients/?name=сол')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()],
+            ['солод', 'соль'])
+        self.assertEqual(
+            [warning.id for warning in shared_cache_check(None)],
+            ['recipe_features.W001'])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/ingredients/?name=соль')
+        self.assertEqual(
+            response.json(),
+            [{'id': Ingredient.objects.get(name='соль').id,
+              'name': 'соль', 'measurement_unit': 'г'}])
+
+    @override_settings(INGREDIENT_INDEX_ENABLED=False)
+    def test_endpoint_without_index(self):
+        for term, expected in (('со', ['соль']),
+                               ('сахар', ['сахар', 'сахарная пудра',
+                                          'ванильный сахар'])):
+            with self.subTest(term=term):
+                response = self.client.get(f'/api/ingredients/?name={term}')
+                self.assertEqual(
+                    [ingredient['name'] for ingredient in response.json()],
+                    expected)
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.test import TestCase
+
+from recipe_features.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class LoadCsvTest(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def write(self, name, lines):
+        with open(os.path.join(self.folder, name), 'w',
+                  encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('load-csv', self.folder, *args, stdout=out)
+        return out.getvalue()
+
+    def ingredients(self):
+        return set(Ingredient.objects.filter(
+            name__startswith='csv ').values_list(
+                'name', 'measurement_unit'))
+
+    def test_batches_and_duplicates(self):
+        self.write('Ingredient.csv', ['name,measurement_unit'] + [
+            f'csv {i},г' for i in range(7)] + ['csv 0,г'])
+        Ingredient.objects.create(name='csv 3', measurement_unit='г')
+        out = self.load('--batch-size', '3')
+        self.assertEqual(
+            self.ingredients(), {(f'csv {i}', 'г') for i in range(7)})
+        self.assertIn('Ingredient: 8 rows', out)
+        self.assertIn('rows/sec', out)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.folder, '.load-csv-state.json')))
+
+    def test_conflicts_error(self):
+        self.write('Ingredient.csv', ['name,measurement_unit'] + [
+            f'csv {i},г' for i in range(5)])
+        Ingredient.objects.create(name='csv 3', measurement_unit='г')
+        with self.assertRaisesMessage(CommandError, '2 rows'):
+            self.load('--batch-size', '2', '--conflicts', 'error')
+        self.assertEqual(
+            self.ingredients(), {(f'csv {i}', 'г') for i in (0, 1, 3)})
+        Ingredient.objects.filter(name='csv 3').delete()
+        out = self.load('--batch-size', '2', '--resume')
+        self.assertIn('resuming after 2 rows', out)
+        self.assertEqual(
+            self.ingredients(), {(f'csv {i}', 'г') for i in range(5)})
+
+    def test_update_tags(self):
+        Tag.objects.create(name='Old name', slug='csv-lunch', color='#000000')
+        self.write('tag.csv', [
+            'name,slug,color', 'Lunch,csv-lunch,#9d2610',
+            'Dinner,csv-dinner,#ff0000'])
+        self.load('--conflicts', 'update')
+        self.assertEqual(
+            dict(Tag.objects.filter(slug__startswith='csv-').values_list(
+                'slug', 'name')),
+            {'csv-lunch': 'Lunch', 'csv-dinner': 'Dinner'})
+
+    def test_update_large_batch(self):
+        # One OR branch per row used to exceed SQLite's expression depth.
+        count = 3000
+        author = User.objects.create(username='csv-cook', email='c@mail.com')
+        recipe = Recipe.objects.create(
+            author=author, name='csv pie', text='text', cooking_time=10,
+            image='recipes/pie.jpg')
+        ingredient = Ingredient.objects.create(
+            name='csv 7', measurement_unit='г')
+        recipe.ingredients.add(ingredient, through_defaults={'amount': 1})
+        updated_at = Recipe.objects.get(pk=recipe.pk).updated_at
+        self.write('Ingredient.csv', ['name,measurement_unit'] + [
+            f'csv {i},г' for i in range(count)])
+        self.load('--conflicts', 'update')
+        self.load('--conflicts', 'update', '--batch-size', '500')
+        self.assertEqual(len(self.ingredients()), count)
+        self.assertGreater(
+            Recipe.objects.get(pk=recipe.pk).updated_at, updated_at)
+
+    def test_other_database_errors_keep_their_message(self):
+        self.write('tag.csv', ['name,slug,color', 'Lunch,csv-lunch,#9d2610'])
+        with mock.patch.object(
+                Tag.objects, 'bulk_create',
+                side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(CommandError) as raised:
+                self.load()
+        self.assertTrue(str(raised.exception).startswith('disk I/O error'))
@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe_features.metrics import (REGISTRY, Counter, Histogram, Registry,
+                                     timed_chunks)
+from recipe_features.models import Recipe, Tag
+from users.models import User
+
+
+def sample(text, name, **labels):
+    '''Value of one sample in an exposition, 0 when it is missing.'''
+    selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(
+        rf'^{re.escape(name)}\{{{re.escape(selector)}\}} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0
+
+
+class ExpositionTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    @override_settings(METRICS_DIR='')
+    def test_text_format(self):
+        requests = Counter(
+            'requests_total', 'Requests.', ('route',), registry=self.registry)
+        duration = Histogram(
+            'duration_seconds', 'Duration.', buckets=(.1, 1),
+            registry=self.registry)
+        requests.inc(route='a"b')
+        requests.inc(2, route='a"b')
+        for value in (.05, .5, 5):
+            duration.observe(value)
+        self.assertEqual(self.registry.exposition(), '\n'.join((
+            '# HELP duration_seconds Duration.',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{le="0.1"} 1.0',
+            'duration_seconds_bucket{le="1.0"} 2.0',
+            'duration_seconds_bucket{le="+Inf"} 3.0',
+            'duration_seconds_sum 5.55',
+            'duration_seconds_count 3.0',
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{route="a\\"b"} 3.0',
+        )) + '\n')
+
+    def test_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        duration = Histogram(
+            'duration_seconds', 'Duration.', ('route',), buckets=(1,),
+            registry=self.registry)
+        with override_settings(METRICS_DIR=directory):
+            duration.observe(.5, route='list')
+            # What another worker flushed: one slow request.
+            with open(os.path.join(directory, '1.json'), 'w') as other:
+                json.dump([['duration_seconds', ['list'], [0, 1, 3]]], other)
+            text = self.registry.exposition()
+        self.assertEqual(
+            sample(text, 'duration_seconds_count', route='list'), 2)
+        self.assertEqual(
+            sample(text, 'duration_seconds_sum', route='list'), 3.5)
+        self.assertEqual(
+            sample(text, 'duration_seconds_bucket', route='list', le='1.0'),
+            1)
+
+    def test_reused_pid_does_not_overwrite(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A worker started with the pid of an exited one.
+        successor = Registry()
+        for registry in (self.registry, successor):
+            Counter('requests_total', 'Requests.', ('route',),
+                    registry=registry)
+        with override_settings(METRICS_DIR=directory):
+            with mock.patch('os.getpid', return_value=42):
+                self.registry.metrics['requests_total'].inc(3, route='list')
+                self.registry.flush()
+                text = successor.exposition()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertNotIn('42.json', os.listdir(directory))
+        self.assertEqual(sample(text, 'requests_total', route='list'), 3)
+
+    def test_fork_gets_its_own_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        requests = Counter(
+            'requests_total', 'Requests.', ('route',), registry=self.registry)
+        with override_settings(METRICS_DIR=directory):
+            with mock.patch('os.getpid', return_value=1):
+                requests.inc(3, route='list')
+                self.registry.flush()
+            # The child drops the parent's values, they are in its file.
+            with mock.patch('os.getpid', return_value=2):
+                requests.inc(route='list')
+                text = self.registry.exposition()
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertEqual(sample(text, 'requests_total', route='list'), 4)
+
+    def test_streamed_export_is_timed_once_read(self):
+        def count():
+            return sample(
+                REGISTRY.exposition(), 'export_render_duration_seconds_count',
+                format='test')
+
+        before = count()
+        chunks = timed_chunks('test', iter((b'a', b'b')))
+        self.assertEqual(next(chunks), b'a')
+        self.assertEqual(count(), before)
+        self.assertEqual(list(chunks), [b'b'])
+        self.assertEqual(count(), before + 1)
+
+
+class MetricsEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create(
+            username='metrics-cook', email='cook@mail.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.cook, name='Metered pie', text='text',
+            cooking_time=10, image='recipes/pie.jpg')
+        Tag.objects.create(
+            name='metrics-lunch', slug='metrics-lunch', color='#000000')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_requests_by_viewset_action(self):
+        before = self.scrape()
+        self.client.get('/api/recipes/')
+        self.client.get(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.get('/api/no-such-page/')
+        after = self.scrape()
+        for labels in (
+                {'route': 'RecipeViesSet.list', 'method': 'GET',
+                 'status': '200'},
+                {'route': 'RecipeViesSet.favorite', 'method': 'GET',
+                 'status': '401'},
+                {'route': 'unmatched', 'method': 'GET', 'status': '404'}):
+            with self.subTest(**labels):
+                self.assertEqual(
+                    sample(after, 'http_requests_total', **labels)
+                    - sample(before, 'http_requests_total', **labels), 1)
+        self.assertGreater(
+            sample(after, 'http_request_db_queries_sum',
+                   route='RecipeViesSet.list'), 0)
+
+    def test_cache_hits(self):
+        before = self.scrape()
+        self.client.get('/api/tags/')
+        self.client.get('/api/tags/')
+        after = self.scrape()
+        for result in ('hit', 'miss'):
+            with self.subTest(result=result):
+                self.assertEqual(
+                    sample(after, 'cache_lookups_total',
+                           cache='tags', result=result)
+                    - sample(before, 'cache_lookups_total',
+                             cache='tags', result=result), 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipe_features.models import Recipe
+from users.models import User
+
+
+class RecipeKeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.pud_date = timezone.now()
+        for i in range(7):
+            cls.create_recipe(f'Recipe {i}')
+
+    @classmethod
+    def create_recipe(cls, name):
+        return Recipe.objects.create(
+            author=cls.author, name=name, text='text', cooking_time=10,
+            image='recipes/test.png', pud_date=cls.pud_date)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def scroll(self, url, on_page=None):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+            if on_page:
+                on_page()
+        return ids
+
+    def test_walks_all_recipes_in_ordering(self):
+        ids = self.scroll('/api/recipes/?cursor=&limit=3')
+        self.assertEqual(
+            ids, list(Recipe.objects.values_list('id', flat=True)))
+
+    def test_insertions_do_not_shift_pages(self):
+        expected = list(Recipe.objects.values_list('id', flat=True))
+        ids = self.scroll(
+            '/api/recipes/?cursor=&limit=2',
+            on_page=lambda: self.create_recipe('Inserted'))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get('/api/recipes/?limit=3')
+        self.assertEqual(response.data['count'], 7)
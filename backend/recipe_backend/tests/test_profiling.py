@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from recipe_features.models import Recipe, Tag
+from recipe_features.profiling import (RequestProfile, fingerprint,
+                                       profiled_data, slow_requests)
+from users.models import RoleChoises, User
+
+
+class FingerprintTest(TestCase):
+    def test_literals_and_placeholders(self):
+        self.assertEqual(
+            fingerprint(
+                'SELECT "t"."id" FROM "t" WHERE "t"."id" = %s\n'
+                "  AND \"t\".\"name\" = 'it''s' LIMIT 21"),
+            'SELECT "t"."id" FROM "t" WHERE "t"."id" = ? '
+            'AND "t"."name" = ? LIMIT ?')
+
+    def test_in_lists_of_any_length(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM "u0" WHERE "id" IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 FROM "u0" WHERE "id" IN (%s, %s)'))
+
+    def test_similar_and_duplicate_queries(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for pk in (1, 2, 3, 3):
+                list(Tag.objects.filter(pk=pk))
+        self.assertEqual(len(profile.queries), 4)
+        self.assertEqual(profile.duplicates()[0]['count'], 2)
+        [group] = profile.similar()
+        self.assertEqual(group['count'], 4)
+        self.assertIn('WHERE "recipe_features_tag"."id" = ?',
+                      group['fingerprint'])
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_REQUEST_MS=0)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='profiling-admin', email='admin@mail.com',
+            role=RoleChoises.ADMIN)
+        cls.cook = User.objects.create(
+            username='profiling-cook', email='cook@mail.com')
+        Recipe.objects.create(
+            author=cls.cook, name='Profiled pie', text='text',
+            cooking_time=10, image='recipes/pie.jpg')
+
+    def setUp(self):
+        slow_requests.clear()
+        self.client = APIClient()
+
+    def test_server_timing(self):
+        response = self.client.get('/api/recipes/')
+        timing = dict(
+            metric.strip().split(';', 1)
+            for metric in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'total', 'db', 'serializer'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="\d+ queries"$')
+
+    def test_serializers_are_patched_only_during_requests(self):
+        original = BaseSerializer.data
+        with mock.patch(
+                'recipe_features.profiling.profiled_data',
+                wraps=profiled_data) as timed:
+            self.client.get('/api/recipes/')
+        timed.assert_called()
+        self.assertIs(BaseSerializer.data, original)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/recipes/'))
+
+    def test_slow_requests_for_admins_only(self):
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(self.cook)
+        self.assertEqual(
+            self.client.get('/api/profiling/requests/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/profiling/requests/')
+        self.assertEqual(response.status_code, 200)
+        recipes = [
+            request for request in response.data['requests']
+            if request['view'] == 'recipes-list']
+        self.assertEqual(len(recipes), 1)
+        self.assertGreater(recipes[0]['queries'], 0)
+        self.assertGreater(recipes[0]['serializer_ms'], 0)
+        self.assertEqual(
+            self.client.delete('/api/profiling/requests/').status_code, 204)
+        # Only the DELETE itself, recorded after it emptied the buffer.
+        self.assertEqual(
+            [request['method'] for request in self.client.get(
+                '/api/profiling/requests/').data['requests']],
+            ['DELETE'])
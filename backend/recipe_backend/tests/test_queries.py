@@ -0,0 +1,147 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe_features.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                                    RecipeIngredient, Tag)
+from users.models import User
+
+
+class RecipeListQueriesTest(TestCase):
+    '''The recipe list must cost the same number of queries for any page.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.reader = User.objects.create(
+            username='reader', email='reader@mail.com')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'tag {i}', slug=f'tag-{i}', color='#000000')
+            for i in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient {i}', measurement_unit='g')
+            for i in range(5)]
+        for i in range(20):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Recipe {i}', text='text',
+                cooking_time=10, image='recipes/test.png')
+            recipe.tags.set(cls.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1)
+                for ingredient in cls.ingredients)
+            if i % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if i % 3:
+                Cart.objects.create(user=cls.reader, purchase=recipe)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        small, _ = self.count_queries('/api/recipes/?limit=2')
+        large, _ = self.count_queries('/api/recipes/?limit=20')
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 4)
+
+    def test_flags_match_database_state(self):
+        _, data = self.count_queries('/api/recipes/?limit=20')
+        for recipe in data['results']:
+            with self.subTest(recipe=recipe['id']):
+                self.assertEqual(
+                    recipe['is_favorited'],
+                    Favorite.objects.filter(
+                        user=self.reader, recipe=recipe['id']).exists())
+                self.assertEqual(
+                    recipe['is_in_shopping_cart'],
+                    Cart.objects.filter(
+                        user=self.reader, purchase=recipe['id']).exists())
+                self.assertTrue(recipe['author']['is_subscribed'])
+                self.assertEqual(len(recipe['ingredients']), 5)
+                self.assertEqual(len(recipe['tags']), 3)
+
+    def test_anonymous_flags_are_false(self):
+        self.client.force_authenticate(None)
+        _, data = self.count_queries('/api/recipes/')
+        for recipe in data['results']:
+            self.assertFalse(recipe['is_favorited'])
+            self.assertFalse(recipe['is_in_shopping_cart'])
+            self.assertFalse(recipe['author']['is_subscribed'])
+
+
+class SubscriptionsQueriesTest(TestCase):
+    '''Subscriptions page cost must not grow with the number of authors.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader', email='reader@mail.com')
+        for i in range(6):
+            author = User.objects.create(
+                username=f'author{i}', email=f'author{i}@mail.com')
+            Follow.objects.create(user=cls.reader, author=author)
+            for j in range(i):
+                Recipe.objects.create(
+                    author=author, name=f'Recipe {i}.{j}', text='text',
+                    cooking_time=10, image='recipes/test.png')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        small, _ = self.get('/api/users/subscriptions/?limit=1')
+        large, _ = self.get('/api/users/subscriptions/?limit=6')
+        self.assertEqual(small, large)
+
+    def test_recipes_limit(self):
+        _, data = self.get(
+            '/api/users/subscriptions/?limit=6&recipes_limit=2')
+        for author in data['results']:
+            with self.subTest(author=author['username']):
+                expected = Recipe.objects.filter(author=author['id'])
+                self.assertTrue(author['is_subscribed'])
+                self.assertEqual(author['recipes_count'], expected.count())
+                self.assertEqual(
+                    [recipe['id'] for recipe in author['recipes']],
+                    list(expected.values_list('id', flat=True)[:2]))
+
+    def test_zero_recipes_limit(self):
+        _, data = self.get('/api/users/subscriptions/?recipes_limit=0')
+        self.assertTrue(data['results'])
+        for author in data['results']:
+            self.assertEqual(author['recipes'], [])
+
+    def test_invalid_recipes_limit(self):
+        author = User.objects.create(
+            username='unfollowed', email='unfollowed@mail.com')
+        for value in ('-1', 'two', '1.5'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?recipes_limit={value}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+                response = self.client.get(
+                    f'/api/users/{author.id}/subscribe/'
+                    f'?recipes_limit={value}')
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(Follow.objects.filter(
+                    user=self.reader, author=author).exists())
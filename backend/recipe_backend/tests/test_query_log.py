@@ -0,0 +1,93 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipe_features.models import Recipe
+from recipe_features.query_log import (QueryLogger, log_files, percentile,
+                                       read_entries)
+from recipe_features.serializers import RecipeSerializer
+from users.models import User
+
+
+class QueryLogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create(
+            username='query-log-cook', email='cook@mail.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.cook, name='Logged pie', text='text',
+            cooking_time=10, image='recipes/pie.jpg')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            QUERY_LOG_ENABLED=True, QUERY_LOG_SAMPLE_RATE=1,
+            QUERY_LOG_MIN_MS=0, QUERY_LOG_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+
+    def entries(self):
+        return list(read_entries(log_files(self.directory)))
+
+    def test_sampled_request(self):
+        self.client.get('/api/recipes/?search=Logged')
+        entries = [
+            entry for entry in self.entries()
+            if entry['view'] == 'RecipeViesSet.list']
+        self.assertTrue(entries)
+        for entry in entries:
+            self.assertNotIn('Logged', entry['fingerprint'])
+            self.assertTrue(entry['caller'].startswith('recipe_features/'))
+
+    @override_settings(QUERY_LOG_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        self.client.get('/api/recipes/')
+        self.assertEqual(self.entries(), [])
+
+    def test_serializer_method(self):
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = self.cook
+        with connection.execute_wrapper(QueryLogger(request)):
+            RecipeSerializer(self.recipe, context={'request': request}).data
+        sites = {
+            (entry['serializer'], entry['caller'].split(':')[0])
+            for entry in self.entries()}
+        self.assertIn(
+            ('RecipeSerializer.favorite', 'recipe_features/serializers.py'),
+            sites)
+
+    def test_analyze(self):
+        path = f'{self.directory}/queries-1.jsonl'
+        with open(path, 'w') as log:
+            for fingerprint, ms in (
+                    ('SELECT a', 1), ('SELECT a', 1), ('SELECT a', 1),
+                    ('SELECT b', 10)):
+                log.write(json.dumps({
+                    'fingerprint': fingerprint, 'ms': ms, 'view': 'V.list',
+                    'serializer': None, 'caller': 'views.py:1 list'}) + '\n')
+            log.write('{"cut')
+        output = StringIO()
+        call_command('analyze-query-log', '--order', 'calls', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], '4 queries, 2 fingerprints in 1 files')
+        self.assertIn('1. total 3.0 ms  calls 3', lines[2])
+        self.assertEqual(lines[3].strip(), 'SELECT a')
+        self.assertEqual(lines[4].strip(), '3x V.list - views.py:1 list')
+        self.assertIn('2. total 10.0 ms  calls 1', lines[6])
+
+    def test_analyze_without_logs(self):
+        with self.assertRaises(CommandError):
+            call_command('analyze-query-log', stdout=StringIO())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, .95), 95)
+        self.assertEqual(percentile([7], .95), 7)
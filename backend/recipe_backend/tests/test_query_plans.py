@@ -0,0 +1,128 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe_features.models import Recipe
+from tests.benchmarks.seeding import seed
+from users.models import User
+
+PLAN_RECIPES = 5000
+
+if connection.vendor == 'postgresql':
+    EXPLAIN = 'EXPLAIN '
+    FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+    SORT = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b', re.M)
+else:
+    EXPLAIN = 'EXPLAIN QUERY PLAN '
+    FULL_SCAN = re.compile(r'\bSCAN (\w+)$', re.M)
+    SORT = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF)')
+
+# Tables that grow with the catalog; small lookup tables may be scanned.
+HOT_TABLES = {
+    'recipe_features_recipe', 'recipe_features_recipe_tags',
+    'recipe_features_recipeingredient', 'recipe_features_favorite',
+    'recipe_features_cart', 'recipe_features_follow', 'users_user',
+}
+# Table aliases Django gives subqueries (U0, U1, ...) on SQLite.
+SUBQUERY_ALIAS = re.compile(r'^U\d+$', re.I)
+AGGREGATE = re.compile(r'^SELECT (?:COUNT|MAX)\(')
+
+
+class QueryPlanTest(TestCase):
+    '''
+    EXPLAIN every query of the hot endpoints on a seeded catalog.
+
+    A query fails when it reads a whole growing table or sorts rows an
+    index could return in order. Runs on Postgres and on SQLite (EXPLAIN
+    QUERY PLAN), the indexes in recipe_features.models serve both.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(PLAN_RECIPES, users=1000, tags=32)
+        cls.reader_id = cls.data.users[0]
+        cls.author_id = Recipe.objects.values_list(
+            'author', flat=True).first()
+        cls.recipe_id = cls.data.recipes[len(cls.data.recipes) // 2]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN + sql)
+            rows = cursor.fetchall()
+        return '\n'.join(str(row[-1]) for row in rows)
+
+    def plans(self, url, user=None):
+        self.client.force_authenticate(
+            None if user is None else User.objects.get(pk=user))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT'):
+                yield sql, self.explain(sql)
+
+    def full_scans(self, sql, plan, counts_all):
+        if counts_all and AGGREGATE.match(sql):
+            return []
+        return [
+            table for table in FULL_SCAN.findall(plan)
+            if table in HOT_TABLES or SUBQUERY_ALIAS.match(table)]
+
+    def assert_plans(self, url, user=None, sort_allowed=False,
+                     counts_all=False):
+        '''
+        `counts_all`: the filter keeps most recipes, so COUNT and MAX read
+        them all whatever the plan. `sort_allowed`: the filter keeps few
+        recipes, sorting them beats walking an index in order.
+        '''
+        for sql, plan in self.plans(url, user):
+            with self.subTest(url=url, sql=sql[:120]):
+                self.assertEqual(
+                    self.full_scans(sql, plan, counts_all), [], plan)
+                if not sort_allowed:
+                    self.assertIsNone(SORT.search(plan), plan)
+
+    def test_feed(self):
+        self.assert_plans('/api/recipes/', counts_all=True)
+        self.assert_plans('/api/recipes/?cursor=')
+
+    def test_author_feed(self):
+        self.assert_plans(f'/api/recipes/?author={self.author_id}')
+
+    def test_recipe(self):
+        self.assert_plans(f'/api/recipes/{self.recipe_id}/', self.reader_id)
+
+    def test_tag_filter(self):
+        # A few percent of the recipes match, sorting them is cheaper
+        # than walking the feed index.
+        self.assert_plans(
+            '/api/recipes/?tags=bench-tag-1', sort_allowed=True)
+
+    def test_favorites(self):
+        self.assert_plans(
+            '/api/recipes/?is_favorited=1', self.reader_id,
+            sort_allowed=True)
+        self.assert_plans(
+            '/api/recipes/?is_in_shopping_cart=1', self.reader_id,
+            sort_allowed=True)
+
+    def test_negated_flags(self):
+        self.assert_plans(
+            '/api/recipes/?is_favorited=0', self.reader_id, counts_all=True)
+        self.assert_plans(
+            '/api/recipes/?is_in_shopping_cart=0', self.reader_id,
+            counts_all=True)
+
+    def test_subscriptions(self):
+        self.assert_plans(
+            '/api/users/subscriptions/?recipes_limit=3', self.reader_id,
+            sort_allowed=True)
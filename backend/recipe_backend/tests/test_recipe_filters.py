@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe_features.models import Cart, Favorite, Recipe, Tag
+from users.models import User
+
+
+class TagFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=slug, slug=slug, color='#000000')
+            for slug in ('filter-breakfast', 'filter-lunch', 'filter-dinner'))
+        cls.both = cls.recipe('Both', cls.breakfast, cls.lunch)
+        cls.lunch_only = cls.recipe('Lunch', cls.lunch)
+        cls.recipe('Dinner', cls.dinner)
+
+    @classmethod
+    def recipe(cls, name, *tags):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text='text', cooking_time=10,
+            image='recipes/pie.jpg')
+        recipe.tags.set(tags)
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, *slugs):
+        return self.client.get('/api/recipes/', {'tags': slugs})
+
+    def test_any_of_the_tags_without_duplicates(self):
+        response = self.get('filter-breakfast', 'filter-lunch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.lunch_only.id, self.both.id])
+
+    def test_unknown_slug(self):
+        self.assertEqual(self.get('filter-brunch').status_code, 400)
+
+    def count_queries(self, *slugs):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get(*slugs).status_code, 200)
+        return len(context.captured_queries)
+
+    def test_slugs_are_resolved_from_the_cache(self):
+        first = self.count_queries('filter-lunch')
+        self.assertEqual(self.count_queries('filter-lunch'), first - 1)
+        Tag.objects.create(
+            name='filter-brunch', slug='filter-brunch', color='#000000')
+        self.assertEqual(self.get('filter-brunch').status_code, 200)
+
+
+class UserFlagFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.reader = User.objects.create(
+            username='reader', email='reader@mail.com')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Flag {i}', text='text',
+                cooking_time=10, image='recipes/pie.jpg')
+            for i in range(4)]
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        Favorite.objects.create(user=cls.author, recipe=cls.recipes[1])
+        Cart.objects.create(user=cls.reader, purchase=cls.recipes[2])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def found(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/', {'limit': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        self.queries = [query['sql'] for query in context.captured_queries]
+        return {
+            recipe['id'] for recipe in response.data['results']
+        } & {recipe.id for recipe in self.recipes}
+
+    def test_flags(self):
+        self.client.force_authenticate(self.reader)
+        first, second, third, fourth = (recipe.id for recipe in self.recipes)
+        for params, expected in (
+                ({'is_favorited': 1}, {first}),
+                ({'is_favorited': 0}, {second, third, fourth}),
+                ({'is_in_shopping_cart': 1}, {third}),
+                ({'is_in_shopping_cart': 0}, {first, second, fourth}),
+                ({'is_favorited': 0, 'is_in_shopping_cart': 0},
+                 {second, fourth})):
+            with self.subTest(**params):
+                self.assertEqual(self.found(**params), expected)
+                # Subqueries only, the recipe rows are never joined.
+                self.assertFalse(any(
+                    'JOIN "recipe_features_favorite"' in sql
+                    or 'JOIN "recipe_features_cart"' in sql
+                    for sql in self.queries))
+
+    def test_anonymous(self):
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            with self.subTest(flag=flag):
+                self.assertEqual(self.found(**{flag: 1}), set())
+                self.assertEqual(
+                    self.found(**{flag: 0}),
+                    {recipe.id for recipe in self.recipes})
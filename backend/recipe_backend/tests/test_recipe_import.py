@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import tempfile
+import warnings
+import zipfile
+from datetime import datetime
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from PIL import Image
+from recipe_features.models import Ingredient, Recipe, Tag
+from recipe_features.recipe_import import RecipeImporter, open_images
+from users.models import RoleChoises, User
+
+
+def png():
+    data = BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(data, 'PNG')
+    return data.getvalue()
+
+
+class RecipeImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='import-admin', email='admin@mail.com',
+            role=RoleChoises.ADMIN)
+        cls.cook = User.objects.create(
+            username='import-cook', email='cook@mail.com')
+        cls.tag = Tag.objects.create(
+            name='Import dinner', slug='import-dinner', color='#8775D2')
+        cls.flour = Ingredient.objects.create(
+            name='Import flour', measurement_unit='g')
+        cls.egg = Ingredient.objects.create(
+            name='Import egg', measurement_unit='pcs')
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        media = override_settings(MEDIA_ROOT=os.path.join(
+            self.folder, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(self.folder, 'images'))
+        with open(os.path.join(self.folder, 'images', 'pie.png'),
+                  'wb') as f:
+            f.write(png())
+
+    def rows(self):
+        good = {
+            'name': 'Imported pie', 'text': 'Bake it', 'cooking_time': 40,
+            'tags': ['import-dinner'], 'image': 'pie.png',
+            'author': 'import-cook',
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 300},
+                {'name': 'Import egg', 'measurement_unit': 'pcs',
+                 'amount': 2}]}
+        return [
+            json.dumps(good),
+            json.dumps(dict(good, name='Second pie', author=None)),
+            '{broken',
+            '',
+            json.dumps(dict(
+                good, tags=[999], image='missing.png',
+                ingredients=[{'id': self.flour.id, 'amount': 0}])),
+        ]
+
+    def assert_imported(self):
+        pie = Recipe.objects.get(name='Imported pie')
+        self.assertEqual(pie.author, self.cook)
+        self.assertEqual(list(pie.tags.all()), [self.tag])
+        self.assertEqual(
+            dict(pie.recipe_ingredients.values_list('ingredient', 'amount')),
+            {self.flour.id: 300, self.egg.id: 2})
+        self.assertTrue(pie.image.name.startswith('recipes/pie'))
+        self.assertEqual(
+            Recipe.objects.get(name='Second pie').author, self.admin)
+
+    def test_command(self):
+        path = os.path.join(self.folder, 'recipes.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.rows()))
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import-recipes', path, '--images',
+            os.path.join(self.folder, 'images'), '--author', 'import-admin',
+            '--chunk-size', '2', stdout=out, stderr=err)
+        self.assert_imported()
+        self.assertIn('Imported 2 recipes, 2 rows rejected.', out.getvalue())
+        self.assertIn('line 3: Invalid JSON', err.getvalue())
+        self.assertIn('line 5: ', err.getvalue())
+
+    def test_endpoint(self):
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as f:
+            f.writestr('pie.png', png())
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/recipes/import/', {
+            'recipes': SimpleUploadedFile(
+                'recipes.ndjson', '\n'.join(self.rows()).encode()),
+            'images': SimpleUploadedFile('images.zip', archive.getvalue()),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        errors = {error['line']: error['error']
+                  for error in response.data['errors']}
+        self.assertEqual(set(errors), {3, 5})
+        for message in ('tags: unknown [999]', 'missing.png',
+                        'amount of'):
+            self.assertIn(message, errors[5])
+        self.assert_imported()
+
+    def importer(self):
+        return RecipeImporter(
+            open_images(os.path.join(self.folder, 'images')),
+            default_author=self.admin)
+
+    def media_files(self):
+        return [
+            name for _, _, names in os.walk(settings.MEDIA_ROOT)
+            for name in names]
+
+    def test_naive_pud_date_is_in_time_zone(self):
+        row = json.loads(self.rows()[0])
+        with warnings.catch_warnings():
+            # Django warns when a naive datetime is saved with USE_TZ.
+            warnings.simplefilter('error', RuntimeWarning)
+            self.importer().run([
+                json.dumps(dict(row, pud_date='2021-03-01T12:00:00')),
+                json.dumps(dict(
+                    row, name='Second pie',
+                    pud_date='2021-03-01T12:00:00Z'))])
+        self.assertEqual(
+            Recipe.objects.get(name='Imported pie').pud_date,
+            timezone.make_aware(datetime(2021, 3, 1, 12)))
+        self.assertEqual(
+            Recipe.objects.get(name='Second pie').pud_date,
+            datetime(2021, 3, 1, 12, tzinfo=timezone.utc))
+
+    def test_images_of_rejected_rows_are_deleted(self):
+        importer = self.importer()
+        with mock.patch.object(
+                RecipeImporter, 'write', side_effect=DatabaseError('down')):
+            importer.run(self.rows()[:2])
+        self.assertEqual(importer.created, 0)
+        self.assertEqual(
+            [message for _, message in importer.errors], ['down', 'down'])
+        self.assertEqual(self.media_files(), [])
+
+    def test_images_are_deleted_on_unexpected_errors(self):
+        with mock.patch.object(
+                RecipeImporter, 'write', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.importer().run(self.rows()[:2])
+        self.assertEqual(self.media_files(), [])
+
+    def test_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.cook)
+        response = client.post('/api/recipes/import/', {}, format='multipart')
+        self.assertEqual(response.status_code, 403)
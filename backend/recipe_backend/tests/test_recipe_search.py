@@ -0,0 +1,109 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipe_features import search
+from recipe_features.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+class RecipeSearchTest(TestCase):
+    '''Ranked search over the name, ingredient names and text.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.other = User.objects.create(
+            username='other', email='other@mail.com')
+        cls.soup_tag, cls.salad_tag = (
+            Tag.objects.create(name=name, slug=name, color='#000000')
+            for name in ('search-soup', 'search-salad'))
+        cls.tomato, cls.zucchini = (
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('tomato', 'zucchini'))
+        cls.in_name = cls.recipe(
+            'Tomato soup', 'Simmer for an hour.', cls.author,
+            cls.soup_tag, cls.zucchini)
+        cls.in_ingredients = cls.recipe(
+            'Summer stew', 'Simmer everything.', cls.author,
+            cls.soup_tag, cls.tomato)
+        cls.in_text = cls.recipe(
+            'Green salad', 'Serve with a slice of tomato.', cls.other,
+            cls.salad_tag, cls.zucchini)
+        search.refresh()
+
+    @classmethod
+    def recipe(cls, name, text, author, tag, ingredient):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10,
+            image='recipes/pie.jpg')
+        recipe.tags.add(tag)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=100)
+        return recipe
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def found(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.found(search='tomato'), [
+            self.in_name.id, self.in_ingredients.id, self.in_text.id])
+
+    def test_all_words_must_match(self):
+        self.assertCountEqual(
+            self.found(search='tomato simmer'),
+            [self.in_name.id, self.in_ingredients.id])
+        self.assertEqual(self.found(search='tomato pineapple'), [])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(
+            self.found(search='tomato', tags='search-salad'),
+            [self.in_text.id])
+        self.assertEqual(
+            self.found(search='zucchini', author=self.author.id),
+            [self.in_name.id])
+
+    def test_query_syntax_is_not_interpreted(self):
+        for term in ('"tomato', 'tomato AND', 'NEAR(', '*', 'zucchini:'):
+            with self.subTest(term=term):
+                self.assertEqual(
+                    self.client.get(
+                        '/api/recipes/', {'search': term}).status_code,
+                    200)
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.recipe(
+                'Pie', 'Bake it.', self.other, self.salad_tag, self.tomato)
+        self.assertIn(recipe.id, self.found(search='pie'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tomato.name = 'cherry tomato'
+            self.tomato.save()
+        self.assertCountEqual(
+            self.found(search='cherry'), [self.in_ingredients.id, recipe.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.text = 'Bake it with pumpkin.'
+            recipe.save()
+            recipe.recipe_ingredients.all().delete()
+        self.assertEqual(self.found(search='pumpkin'), [recipe.id])
+        self.assertNotIn(recipe.id, self.found(search='cherry'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(self.found(search='pumpkin'), [])
+
+    def test_rebuild_command(self):
+        Recipe.objects.filter(pk=self.in_text.pk).update(text='Plain.')
+        self.assertIn(self.in_text.id, self.found(search='tomato'))
+        call_command('rebuild-search-index', stdout=StringIO())
+        self.assertNotIn(self.in_text.id, self.found(search='tomato'))
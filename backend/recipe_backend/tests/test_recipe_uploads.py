@@ -0,0 +1,127 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from PIL import Image
+from recipe_features.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def png(size=(40, 30)):
+    data = BytesIO()
+    Image.new('RGB', size, 'blue').save(data, 'PNG')
+    return data.getvalue()
+
+
+class MultipartUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.tags = [
+            Tag.objects.create(name=name, slug=name, color='#000000')
+            for name in ('upload-lunch', 'upload-dinner')]
+        cls.flour, cls.egg = (
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('Upload flour', 'Upload egg'))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root, BACKGROUND_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def fields(self):
+        return {
+            'name': 'Pie', 'text': 'Bake it', 'cooking_time': 30,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 200},
+                {'id': self.egg.id, 'amount': 2}]}
+
+    def state(self, recipe_id):
+        recipe = Recipe.objects.get(pk=recipe_id)
+        with default_storage.open(recipe.image.name, 'rb') as f:
+            image = f.read()
+        return (
+            recipe.name, recipe.text, recipe.cooking_time,
+            sorted(recipe.tags.values_list('id', flat=True)),
+            sorted(recipe.recipe_ingredients.values_list(
+                'ingredient', 'amount')),
+            recipe.image.name.rsplit('.', 1)[-1], image)
+
+    def post_multipart(self, image, ingredients_as_json=True):
+        data = self.fields()
+        if ingredients_as_json:
+            data['ingredients'] = (
+                f'[{{"id": {self.flour.id}, "amount": 200}}, '
+                f'{{"id": {self.egg.id}, "amount": 2}}]')
+        else:
+            ingredients = data.pop('ingredients')
+            for i, ingredient in enumerate(ingredients):
+                for key, value in ingredient.items():
+                    data[f'ingredients[{i}]{key}'] = value
+        data['image'] = SimpleUploadedFile('photo.png', image)
+        return self.client.post('/api/recipes/', data, format='multipart')
+
+    def test_multipart_and_base64_store_the_same_state(self):
+        image = png()
+        data = self.fields()
+        data['image'] = (
+            'data:image/png;base64,' + base64.b64encode(image).decode())
+        from_json = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(from_json.status_code, 201)
+        for ingredients_as_json in (True, False):
+            with self.subTest(ingredients_as_json=ingredients_as_json):
+                response = self.post_multipart(image, ingredients_as_json)
+                self.assertEqual(response.status_code, 201, response.data)
+                self.assertEqual(
+                    self.state(response.data['id']),
+                    self.state(from_json.data['id']))
+
+    def test_multipart_update(self):
+        recipe_id = self.post_multipart(png()).data['id']
+        response = self.client.patch(f'/api/recipes/{recipe_id}/', {
+            'name': 'Stew', 'cooking_time': 15,
+            'tags': [self.tags[0].id],
+            'ingredients': f'[{{"id": {self.egg.id}, "amount": 3}}]',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        name, _, cooking_time, tags, ingredients, _, _ = self.state(
+            recipe_id)
+        self.assertEqual((name, cooking_time, tags, ingredients), (
+            'Stew', 15, [self.tags[0].id], [(self.egg.id, 3)]))
+
+    def test_size_limit(self):
+        image = png((200, 200))
+        with self.settings(RECIPE_IMAGE_MAX_SIZE=len(image) - 1):
+            response = self.post_multipart(image)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('image', response.data)
+            data = self.fields()
+            data['image'] = base64.b64encode(image).decode()
+            response = self.client.post('/api/recipes/', data, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_dimension_limit(self):
+        with self.settings(RECIPE_IMAGE_MAX_DIMENSION=100):
+            response = self.post_multipart(png((101, 20)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('100x100', str(response.data['image']))
+
+    def test_not_an_image(self):
+        response = self.post_multipart(b'plain text')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
@@ -0,0 +1,150 @@
+from django.test import TestCase
+from django.test.client import RequestFactory
+from rest_framework.test import APIClient
+
+from recipe_features import shopping_list
+from recipe_features.models import (Cart, Ingredient, Recipe, RecipeIngredient,
+                                    Tag)
+from recipe_features.serializers import PostRecipeSerializer
+from users.models import User
+
+
+class RecipeWritesTest(TestCase):
+    '''Ingredient and tag links are written in bulk, whatever their number.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.buyer = User.objects.create(
+            username='buyer', email='buyer@mail.com')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ingredient {i}', measurement_unit='g')
+            for i in range(40))
+        cls.ingredients = list(Ingredient.objects.filter(
+            name__startswith='Ingredient ').order_by('id'))
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (
+                ('breakfast', '#E26C2D'), ('lunch', '#49B64E'),
+                ('dinner', '#8775D2'))]
+
+    def data(self, ingredients, tags, name='Soup'):
+        return {
+            'name': name, 'text': 'text', 'cooking_time': 10,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients]}
+
+    def save(self, data, instance=None):
+        serializer = PostRecipeSerializer(
+            instance=instance, data=data, partial=instance is not None,
+            context={'request': RequestFactory().post('/')})
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def links(self, recipe):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient', 'amount'))
+
+    def create_recipe(self, count=30):
+        serializer = self.save(self.data(
+            [(ingredient, 10) for ingredient in self.ingredients[:count]],
+            self.tags[:2]))
+        return serializer.save(author=self.author)
+
+    def test_create_with_30_ingredients(self):
+        serializer = self.save(self.data(
+            [(ingredient, 10) for ingredient in self.ingredients[:30]],
+            self.tags[:2]))
+        # Savepoint, recipe, tag links, ingredient links, release.
+        with self.assertNumQueries(5):
+            recipe = serializer.save(author=self.author)
+        self.assertEqual(len(self.links(recipe)), 30)
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_update_with_30_ingredients(self):
+        recipe = self.create_recipe()
+        Cart.objects.create(user=self.buyer, purchase=recipe)
+        before = Recipe.objects.get(pk=recipe.pk).updated_at
+        ingredients = (
+            # 20 unchanged, 5 with a new amount, 5 new, 5 dropped.
+            [(ingredient, 10) for ingredient in self.ingredients[:20]]
+            + [(ingredient, 15) for ingredient in self.ingredients[20:25]]
+            + [(ingredient, 7) for ingredient in self.ingredients[30:35]])
+        serializer = self.save(
+            self.data(ingredients, self.tags[1:], name='Stew'),
+            instance=recipe)
+        # Savepoint, tags select/delete/insert, ingredients select,
+        # rows to delete select/delete, bulk update, insert, carts select,
+        # shopping list savepoint/lock/select/insert/update/delete/release,
+        # recipe update, release.
+        with self.assertNumQueries(19):
+            serializer.save(author=self.author)
+        self.assertEqual(self.links(recipe), {
+            ingredient.id: amount for ingredient, amount in ingredients})
+        self.assertEqual(
+            set(recipe.tags.values_list('slug', flat=True)),
+            {'lunch', 'dinner'})
+        self.assertGreater(
+            Recipe.objects.get(pk=recipe.pk).updated_at, before)
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.compute_totals())
+
+    def test_unchanged_update_writes_no_links(self):
+        recipe = self.create_recipe()
+        serializer = self.save(self.data(
+            [(ingredient, 10) for ingredient in self.ingredients[:30]],
+            self.tags[:2]), instance=recipe)
+        # Savepoint, tags select, ingredients select, recipe update,
+        # release.
+        with self.assertNumQueries(5):
+            serializer.save(author=self.author)
+        self.assertEqual(len(self.links(recipe)), 30)
+
+    def test_api_update_response(self):
+        recipe = self.create_recipe(count=3)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{recipe.id}/',
+            self.data([(self.ingredients[0], 5)], self.tags[:1]),
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['name'], row['amount'])
+             for row in response.data['ingredients']],
+            [('Ingredient 0', 5)])
+        self.assertEqual(
+            [tag['slug'] for tag in response.data['tags']], ['breakfast'])
+
+    def test_40_ingredients_validate_in_two_queries(self):
+        serializer = PostRecipeSerializer(
+            data=self.data(
+                [(ingredient, 10) for ingredient in self.ingredients],
+                self.tags),
+            context={'request': RequestFactory().post('/')})
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data['ingredients'][0]['id'],
+            self.ingredients[0])
+        self.assertEqual(serializer.validated_data['tags'], self.tags)
+
+    def test_all_missing_ids_are_reported(self):
+        data = self.data(
+            [(ingredient, 10) for ingredient in self.ingredients[:2]],
+            self.tags[:1])
+        data['ingredients'] += [
+            {'id': 9001, 'amount': 1}, {'id': 9000, 'amount': 1}]
+        data['tags'] += [777]
+        serializer = PostRecipeSerializer(
+            data=data, context={'request': RequestFactory().post('/')})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors['ingredients']['non_field_errors'],
+            ['Invalid pk 9000, 9001 - object does not exist.'])
+        self.assertEqual(
+            serializer.errors['tags'],
+            ['Invalid pk 777 - object does not exist.'])
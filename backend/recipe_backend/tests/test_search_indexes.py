@@ -0,0 +1,43 @@
+from hashlib import md5
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+
+from recipe_features.filters import IngredientSearchFilter
+from recipe_features.models import Ingredient
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are Postgres')
+class IngredientSearchPlanTest(TestCase):
+    '''Name search must be served by indexes, not by a sequential scan.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(
+                name=md5(str(i).encode()).hexdigest(), measurement_unit='г')
+            for i in range(20000))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipe_features_ingredient')
+
+    def search(self, term):
+        request = Request(RequestFactory().get('/', {'name': term}))
+        return IngredientSearchFilter().filter_queryset(
+            request, Ingredient.objects.all(), view=None)
+
+    def assert_no_seq_scan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_prefix_search_uses_index(self):
+        self.assert_no_seq_scan(self.search('ab'))
+
+    def test_contains_search_uses_index(self):
+        self.assert_no_seq_scan(self.search('abcd'))
+
+    def test_prefix_matches_come_first(self):
+        names = [ingredient.name for ingredient in self.search('abc')]
+        prefixed = [name.startswith('abc') for name in names]
+        self.assertEqual(prefixed, sorted(prefixed, reverse=True))
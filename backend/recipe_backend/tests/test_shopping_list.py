@@ -0,0 +1,123 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipe_features import shopping_list
+from recipe_features.models import (Cart, Ingredient, Recipe, RecipeIngredient,
+                                    ShoppingListItem)
+from users.models import User
+
+
+class ShoppingListAggregateTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@mail.com')
+        cls.buyer = User.objects.create(
+            username='buyer', email='buyer@mail.com')
+        cls.flour, cls.egg, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('Flour', 'Egg', 'Milk'))
+        cls.pie, cls.cake = (
+            Recipe.objects.create(
+                author=cls.author, name=name, text='text', cooking_time=10,
+                image='recipes/test.png')
+            for name in ('Pie', 'Cake'))
+        for recipe, ingredient, amount in (
+                (cls.pie, cls.flour, 100), (cls.pie, cls.egg, 2),
+                (cls.cake, cls.flour, 200), (cls.cake, cls.milk, 50)):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def totals(self):
+        return {
+            ingredient: amount
+            for ingredient, amount in ShoppingListItem.objects.filter(
+                user=self.buyer).values_list('ingredient__name',
+                                             'total_amount')}
+
+    def assert_consistent(self):
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.compute_totals())
+
+    def test_cart_changes(self):
+        for recipe in (self.pie, self.cake):
+            response = self.client.get(
+                f'/api/recipes/{recipe.id}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.totals(), {'Flour': 300, 'Egg': 2, 'Milk': 50})
+        self.client.delete(f'/api/recipes/{self.pie.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {'Flour': 200, 'Milk': 50})
+        self.assert_consistent()
+
+    def test_recipe_ingredient_changes(self):
+        Cart.objects.create(user=self.buyer, purchase=self.pie)
+        link = RecipeIngredient.objects.get(
+            recipe=self.pie, ingredient=self.flour)
+        link.amount = 150
+        link.save()
+        self.assertEqual(self.totals(), {'Flour': 150, 'Egg': 2})
+        link.ingredient = self.milk
+        link.save()
+        self.assertEqual(self.totals(), {'Milk': 150, 'Egg': 2})
+        link.delete()
+        RecipeIngredient.objects.create(
+            recipe=self.pie, ingredient=self.egg, amount=1)
+        self.assertEqual(self.totals(), {'Egg': 3})
+        self.assert_consistent()
+
+    def test_recipe_deleted(self):
+        Cart.objects.create(user=self.buyer, purchase=self.pie)
+        Cart.objects.create(user=self.buyer, purchase=self.cake)
+        self.cake.delete()
+        self.assertEqual(self.totals(), {'Flour': 100, 'Egg': 2})
+        self.assert_consistent()
+
+    def test_download_formats(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        exports = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, exports)
+        settings = self.settings(
+            MEDIA_ROOT=media_root, EXPORT_RESULTS_ROOT=exports)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Cart.objects.create(user=self.buyer, purchase=self.pie)
+        url = '/api/recipes/download_shopping_cart/'
+        for kwargs, content_type in (
+                ({}, 'application/pdf'),
+                ({'HTTP_ACCEPT': '*/*'}, 'application/pdf'),
+                ({'HTTP_ACCEPT': 'text/csv'}, 'text/csv; charset=utf-8'),
+                ({'data': {'format': 'txt'}}, 'text/plain; charset=utf-8'),
+                ({'data': {'format': 'json'}}, 'application/json')):
+            with self.subTest(kwargs=kwargs):
+                response = self.client.get(url, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content))['ingredients'],
+            [{'name': 'Egg', 'measurement_unit': 'g', 'amount': 2},
+             {'name': 'Flour', 'measurement_unit': 'g', 'amount': 100}])
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code,
+                         404)
+
+    def test_rebuild_command(self):
+        Cart.objects.create(user=self.buyer, purchase=self.pie)
+        ShoppingListItem.objects.filter(ingredient=self.egg).delete()
+        out = StringIO()
+        call_command('rebuild-shopping-lists', '--dry-run', stdout=out)
+        self.assertIn('1 mismatched rows', out.getvalue())
+        self.assertNotIn('Egg', self.totals())
+        call_command('rebuild-shopping-lists', stdout=StringIO())
+        self.assertEqual(self.totals(), {'Flour': 100, 'Egg': 2})
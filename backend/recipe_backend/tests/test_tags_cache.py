@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe_features.catalog_version import TAGS, VERSION_KEY
+from recipe_features.models import Recipe, Tag
+from users.models import User
+
+
+class TagsCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Lunch', slug='lunch', color='#9d2610')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_not_modified(self):
+        for url in ('/api/tags/', '/api/tags/lunch/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_cached_body(self):
+        expected = self.client.get('/api/tags/').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/tags/').json(), expected)
+
+    def test_invalidated_on_change(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        self.tag.color = '#000000'
+        self.tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['color'], '#000000')
+        Tag.objects.create(name='Dinner', slug='dinner', color='#ffffff')
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+        self.tag.delete()
+        self.assertEqual(self.client.get('/api/tags/lunch/').status_code, 404)
+
+    def assert_recipe_tagged(self, slug):
+        author = User.objects.create(username='cook', email='cook@mail.com')
+        recipe = Recipe.objects.create(
+            author=author, name='Pie', text='text', cooking_time=10,
+            image='recipes/pie.jpg')
+        recipe.tags.add(Tag.objects.get(slug=slug))
+        response = self.client.get(f'/api/recipes/?tags={slug}')
+        self.assertEqual(
+            [found['id'] for found in response.data['results']], [recipe.id])
+
+    def test_version_bumped_by_another_process(self):
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 1)
+        self.client.get('/api/recipes/?tags=lunch')
+        # load-csv in its own process: no signal here, only the shared
+        # cache tells this one about the new tag.
+        Tag.objects.bulk_create(
+            [Tag(name='Dinner', slug='dinner', color='#ffffff')])
+        FileBasedCache(settings.CACHES['default']['LOCATION'], {}).incr(
+            VERSION_KEY.format(name=TAGS))
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+        self.assert_recipe_tagged('dinner')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('ETag', response)
+        Tag.objects.bulk_create(
+            [Tag(name='Dinner', slug='dinner', color='#ffffff')])
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+        self.assert_recipe_tagged('dinner')
@@ -6,6 +6,24 @@ from recipe_features.serializers import RecipeViewSerializer
 from users.models import User
 
 
+def get_recipes_limit(request):
+    '''Return the `recipes_limit` query param, None when it is not given.
+
+    0 lists no recipes; anything but a non-negative integer is a 400.
+    '''
+    value = request.query_params.get('recipes_limit')
+    if value is None or value == '':
+        return None
+    try:
+        recipes_limit = int(value)
+    except ValueError:
+        recipes_limit = -1
+    if recipes_limit < 0:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Must be a non-negative integer.'})
+    return recipes_limit
+
+
 class FollowViewSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField('get_recipe', read_only=True)
     recipes_count = serializers.SerializerMethodField(
@@ -19,22 +37,29 @@ class FollowViewSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
         return Follow.objects.filter(user=request.user, author=obj).exists()
 
     def recipes_amount(self, data):
+        if hasattr(data, 'recipes_count'):
+            return data.recipes_count
         return Recipe.objects.filter(author=data.id).count()
 
     def get_recipe(self, data):
+        if hasattr(data, 'limited_recipes'):
+            return RecipeViewSerializer(
+                data.limited_recipes, many=True).data
         request = self.context.get('request')
         if not request:
             return []
-        recipes_limit = request.GET.get('recipes_limit')
+        recipes_limit = get_recipes_limit(request)
         recipes = Recipe.objects.filter(author=data.id)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
         return RecipeViewSerializer(
             recipes, many=True).data
 
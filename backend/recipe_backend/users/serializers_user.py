@@ -28,6 +28,8 @@ class CustomUserSerializer(UserSerializer):
         ref_name = 'ReadOnlyUsers'
 
     def get_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -1,3 +1,5 @@
+from django.db.models import BooleanField, Count, F, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -5,8 +7,9 @@ from rest_framework import (filters, mixins, permissions, response, status,
                             viewsets)
 from rest_framework.decorators import action
 
-from .serializers_follow import FollowSerializer, FollowViewSerializer
-from recipe_features.models import Follow
+from .serializers_follow import (FollowSerializer, FollowViewSerializer,
+                                 get_recipes_limit)
+from recipe_features.models import Follow, Recipe
 from recipe_features.pagination_hub import CustomResultsSetPagination
 from recipe_features.permissions import CurrentUserOrAdminOrReadOnly
 from users.models import User
@@ -33,6 +36,8 @@ class CustomUserViewSet(UserViewSet):
     def subscribe(self, request, id):
         if request.method == 'DELETE':
             return self.unsubscribe(request, id)
+        # Rejected before the subscription is saved.
+        get_recipes_limit(request)
         user = self.request.user.id
         author = get_object_or_404(User, id=id)
         data = {'user': user, 'author': id}
@@ -52,10 +57,60 @@ class CustomUserViewSet(UserViewSet):
             status=status.HTTP_204_NO_CONTENT)
 
 
+def attach_recipes(authors, recipes_limit=None):
+    '''Load recipes for all authors in one query.
+
+    With `recipes_limit` only the newest N recipes of every author are
+    fetched: recipes are numbered with ROW_NUMBER() over each author and
+    the outer query keeps the first N rows of every partition. A limit
+    of 0 gives every author an empty list without a query.
+    '''
+    by_author = {author.id: [] for author in authors}
+    if not by_author:
+        return authors
+    recipes = Recipe.objects.filter(author__in=by_author).only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time', 'pud_date',
+        'author_id')
+    if recipes_limit == 0:
+        recipes = []
+    elif recipes_limit is not None:
+        sql, params = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=[F('pud_date').desc(), F('id').desc()],
+        )).order_by().query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            'WHERE ranked.row_number <= %s '
+            'ORDER BY ranked.pud_date DESC, ranked.id DESC',
+            (*params, recipes_limit))
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.limited_recipes = by_author[author.id]
+    return authors
+
+
 class FollowListSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     pagination_class = CustomResultsSetPagination
     serializer_class = FollowViewSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            recipes_count=Count('recipes', distinct=True),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = attach_recipes(
+            list(queryset) if page is None else page,
+            get_recipes_limit(request))
+        serializer = self.get_serializer(authors, many=True)
+        if page is None:
+            return response.Response(serializer.data)
+        return self.get_paginated_response(serializer.data)